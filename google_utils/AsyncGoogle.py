@@ -0,0 +1,413 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from GmailSearchMatcher import GmailSearchMatcher
+
+DEFAULT_CONCURRENCY = 10
+DEFAULT_BATCH_SIZE = 50
+
+"""
+AsyncGoogle: asyncio front-ends for Gmail, GoogleDrive and Youtube.
+
+The google API client is blocking, so every call runs on a bounded thread pool owned by the front-end and an
+asyncio.Semaphore limits how many calls are in flight. Each worker thread uses its own authorized http client
+(see HttpPool). Bulk message fetches are packed into Google batch requests, so hundreds of gets only need a
+handful of threads. Cancelling a task stops waiting on it right away and frees its slot. A request that is
+already on the wire finishes in its worker thread and its result is dropped.
+
+Example usage:
+    async def main():
+        async with AsyncGmail(Gmail(), concurrency=20) as gmail:
+            message_ids = await gmail.list_message_ids(max_results=200)
+            message_contents, errors = await gmail.get_message_contents(message_ids)
+            user_response = await gmail.poll_email_and_get_response_from_user(items_to_match=items)
+
+        async with AsyncGoogleDrive(GoogleDrive()) as google_drive:
+            file_ids = await asyncio.gather(*[google_drive.upload(path) for path in paths])
+
+    asyncio.run(main())
+
+"""
+
+class AsyncGoogleClient:
+
+    """
+    AsyncGoogleClient: constructor - wraps a blocking client with a bounded executor and a concurrency limit
+
+    params:
+        client: Object - Gmail, GoogleDrive or Youtube object
+        concurrency: Integer - maximum number of calls in flight at once
+        executor: concurrent.futures.Executor - executor to run calls on. Defaults to a ThreadPoolExecutor with concurrency threads
+
+    returns:
+    """
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY, executor=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = None
+
+    """
+    AsyncGoogleClient: run - runs a blocking function on the executor once a concurrency slot is free
+
+    params:
+        function: Function - blocking function to call
+        *args, **kwargs - arguments for function
+
+    returns:
+        result of function
+    """
+    async def run(self, function, *args, **kwargs):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    """
+    AsyncGoogleClient: close - shuts down the executor if it was created by this object
+
+    params:
+
+    returns:
+    """
+    def close(self):
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncGmail(AsyncGoogleClient):
+
+    """
+    AsyncGmail(): list_message_ids - async version of Gmail.list_message_ids
+
+    params:
+        max_results: Integer - total number of message ids to return. None returns every matching message
+        q: String - Gmail search query to filter messages server side
+        label_ids: List - only list messages that have all of these label ids
+        page_size: Integer - number of message ids requested per page
+
+    returns:
+        List: message ids, newest first
+    """
+    async def list_message_ids(self, max_results=None, q=None, label_ids=None, page_size=100):
+        return await self.run(lambda: list(self.client.list_message_ids(max_results=max_results, q=q, label_ids=label_ids, page_size=page_size)))
+
+    """
+    AsyncGmail(): list_message_id_pages - async version of Gmail.list_message_id_pages. Pages are handed over as they
+    arrive, while the next one is already being fetched, so work on the first page does not wait for the whole listing
+
+    params:
+        max_results: Integer - total number of message ids to yield. None yields every matching message
+        q: String - Gmail search query to filter messages server side
+        label_ids: List - only list messages that have all of these label ids
+        page_size: Integer - number of message ids requested per page
+
+    returns:
+        AsyncGenerator: yields a List of message ids per page, newest first
+    """
+    async def list_message_id_pages(self, max_results=None, q=None, label_ids=None, page_size=100):
+        pages = self.client.list_message_id_pages(max_results=max_results, q=q, label_ids=label_ids, page_size=page_size)
+        try:
+            while True:
+                page = await self.run(next, pages, None)
+                if page is None:
+                    return
+                yield page
+        finally:
+            pages.close()
+
+    """
+    AsyncGmail(): get_message_content - async version of Gmail.get_message_content
+
+    params:
+        message_id: String - message id provided by Google API
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        metadata_first: Bool - check the filters against a metadata only fetch before downloading the full message
+
+    returns:
+        Dictionary (object): Custom object with pertinent content from a google response.
+    """
+    async def get_message_content(self, message_id, inbox="INBOX", users=[], metadata_first=False):
+        return await self.run(self.client.get_message_content, message_id=message_id, inbox=inbox, users=users, metadata_first=metadata_first)
+
+    """
+    AsyncGmail(): get_message_contents - fetches many messages as concurrent Google batch requests
+
+    params:
+        message_ids: List - message ids provided by Google API
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        batch_size: Integer - number of messages per batch request
+
+    returns:
+        Tuple: (List of message contents in the same order as message_ids, Dictionary of message id to the exception raised for it)
+    """
+    async def get_message_contents(self, message_ids, inbox="INBOX", users=[], batch_size=DEFAULT_BATCH_SIZE):
+        message_ids = list(message_ids)
+        chunks = [message_ids[start:start + batch_size] for start in range(0, len(message_ids), batch_size)]
+        results = await asyncio.gather(*[
+            self.run(self.client.get_message_contents_batch, message_ids=chunk, inbox=inbox, users=users, batch_size=batch_size)
+            for chunk in chunks
+        ])
+
+        message_contents = []
+        errors = {}
+        for chunk_contents, chunk_errors in results:
+            message_contents.extend(chunk_contents)
+            errors.update(chunk_errors)
+        return message_contents, errors
+
+    """
+    AsyncGmail(): send_message - async version of Gmail.send_message
+
+    params:
+        message: Message object - Message to be sent.
+
+    returns:
+        Dictionary (object): Sent message object
+    """
+    async def send_message(self, message):
+        return await self.run(self.client.send_message, message=message)
+
+    """
+    AsyncGmail(): send_messages_bulk - async version of Gmail.send_messages_bulk
+
+    params:
+        recipients: Iterable - email address strings, or dictionaries with a "to" email address and any template fields
+        subject: String - subject template filled in with str.format_map
+        message_text: String - message text template filled in with str.format_map
+        messages_per_second: Number - send rate
+
+    returns:
+        List: {"to", "success", "message_id", "error"} result for every recipient in order
+    """
+    async def send_messages_bulk(self, recipients, subject, message_text, messages_per_second=2):
+        return await self.run(self.client.send_messages_bulk, recipients=recipients, subject=subject, message_text=message_text, messages_per_second=messages_per_second)
+
+    """
+    AsyncGmail(): send_message_with_attachments - async version of Gmail.send_message_with_attachments
+
+    params:
+        to: String - Email address of the receiver.
+        subject: String - The subject of the email message.
+        message_text: String - The text of the email message.
+        files: String or List - The path, or list of paths, to the files to be attached.
+
+    returns:
+        Dictionary (object): Sent message object
+    """
+    async def send_message_with_attachments(self, to, subject, message_text, files):
+        return await self.run(self.client.send_message_with_attachments, to=to, subject=subject, message_text=message_text, files=files)
+
+    """
+    AsyncGmail(): save_attachments_from_message_id - async version of Gmail.save_attachments_from_message_id
+
+    params:
+        message_id: String - message id provided by Google API
+        path_for_attachment: String - path to where the files will be saved. Defaults to current directory.
+        avoid_overwrite: Bool - prefix saved file names with a uuid so existing files are not overwritten
+
+    returns:
+        List: paths of the saved attachments in the order they appear in the message
+    """
+    async def save_attachments_from_message_id(self, message_id, path_for_attachment=".", avoid_overwrite=True):
+        return await self.run(self.client.save_attachments_from_message_id, message_id=message_id, path_for_attachment=path_for_attachment, avoid_overwrite=avoid_overwrite)
+
+    """
+    AsyncGmail(): poll_email_and_get_response_from_user - async version of Gmail.poll_email_and_get_response_from_user.
+    Waits with asyncio.sleep, so cancelling the task stops polling immediately. Does not change the Gmail object's message_ids or message_contents
+
+    params:
+        items_to_match: List - list of item keywords to search for in an email
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        retry_count: Integer - number of times to retry search for email
+        seconds_between_retries: Number - number of seconds to wait before retry
+        max_results: Integer - number of (most recent) emails to check per try. With incremental, only used for the first sync
+        incremental: Bool - only fetch messages added since the previous try, using mailbox history ids
+
+    returns:
+        List: list of objects containing pertinent response data for items passed in
+    """
+    async def poll_email_and_get_response_from_user(self, items_to_match, inbox="INBOX", users=[], retry_count=20, seconds_between_retries=10, max_results=1, incremental=False):
+        matcher = GmailSearchMatcher.for_items(items_to_match)
+        label_ids = [inbox] if inbox else None
+        history_id = None
+
+        user_response = []
+        for tries in range(retry_count):
+            message_ids = None
+            if incremental and history_id:
+                message_ids, next_history_id = await self.run(self.client.list_message_ids_added_since, history_id=history_id, label_id=inbox)
+                if message_ids is not None:
+                    history_id = next_history_id
+            if message_ids is None:
+                if incremental:
+                    history_id = await self.run(self.client.get_mailbox_history_id)
+                message_ids = await self.list_message_ids(max_results=max_results, label_ids=label_ids)
+
+            message_contents, errors = await self.get_message_contents(message_ids, inbox=inbox, users=users)
+            user_response = self.client.get_response_from_user_email(items_to_match=items_to_match, matcher=matcher, message_contents=message_contents)
+            if user_response:
+                break
+            await asyncio.sleep(seconds_between_retries)
+
+        return user_response
+
+
+class AsyncGoogleDrive(AsyncGoogleClient):
+
+    """
+    AsyncGoogleDrive(): pull_and_set_drive_files - async version of GoogleDrive.pull_and_set_drive_files
+
+    params:
+
+    returns:
+        List: drive files now stored on the GoogleDrive object
+    """
+    async def pull_and_set_drive_files(self):
+        await self.run(self.client.pull_and_set_drive_files)
+        return self.client.drive_files
+
+    """
+    AsyncGoogleDrive(): refresh_drive_files - async version of GoogleDrive.refresh_drive_files
+
+    params:
+
+    returns:
+        Integer: number of changes applied, or None if the whole drive was listed
+    """
+    async def refresh_drive_files(self):
+        return await self.run(self.client.refresh_drive_files)
+
+    """
+    AsyncGoogleDrive(): get_file_ids - async version of GoogleDrive.get_file_ids
+
+    params:
+        file_name: String - name of the file on Google Drive
+
+    returns:
+        List: - with file id(s) because there can be multiple instances of a file with the same name
+    """
+    async def get_file_ids(self, file_name):
+        return await self.run(self.client.get_file_ids, file_name)
+
+    """
+    AsyncGoogleDrive(): upload - async version of GoogleDrive.upload
+
+    params:
+        file_path: String - full file path to the file that will be uploaded
+        folder_id: String - Google Drive ID for the folder that you want to upload the file. Defaults to None
+
+    returns:
+        file id: String - the id of the uploaded file from Google Drive
+    """
+    async def upload(self, file_path, folder_id=None):
+        return await self.run(self.client.upload, file_path, folder_id=folder_id)
+
+    """
+    AsyncGoogleDrive(): download - async version of GoogleDrive.download
+
+    params:
+        file_id: String - ID of the file that will be downloaded from Google Drive
+        path: String - path to directory where the download will go. Defaults to the GoogleDrive default
+        progress_callback: Function - called from the worker thread after every chunk with (bytes downloaded, total bytes or None)
+
+    returns:
+        String: path of the downloaded file
+    """
+    async def download(self, file_id, path=None, progress_callback=None):
+        if path is None:
+            return await self.run(self.client.download, file_id, progress_callback=progress_callback)
+        return await self.run(self.client.download, file_id, path, progress_callback=progress_callback)
+
+    """
+    AsyncGoogleDrive(): share - async version of GoogleDrive.share
+
+    params:
+        file_id: String - ID of the file that will be shared from Google Drive
+        email: String - email address that file will be shared with
+
+    returns:
+        Dictionary: {"success", "permission_id", "role", "error"} result of the share
+    """
+    async def share(self, file_id, email):
+        return await self.run(self.client.share, file_id, email)
+
+    """
+    AsyncGoogleDrive(): share_bulk - async version of GoogleDrive.share_bulk
+
+    params:
+        file_ids: List - IDs of the files that will be shared from Google Drive
+        recipients: List or Dictionary - email addresses shared with as role, or email address mapped to its own role
+        role: String - permission role for recipients passed as a list
+
+    returns:
+        Dictionary: file id mapped to email address mapped to {"success", "permission_id", "role", "error"}
+    """
+    async def share_bulk(self, file_ids, recipients, role='reader'):
+        return await self.run(self.client.share_bulk, file_ids, recipients, role=role)
+
+    """
+    AsyncGoogleDrive(): delete - async version of GoogleDrive.delete
+
+    params:
+        file_id: String - ID of the file that will be deleted from Google Drive
+
+    returns:
+    """
+    async def delete(self, file_id):
+        return await self.run(self.client.delete, file_id)
+
+    """
+    AsyncGoogleDrive(): delete_bulk - async version of GoogleDrive.delete_bulk
+
+    params:
+        file_ids: List - IDs of the files that will be deleted from Google Drive
+        trash: Bool - move the files to the trash instead of deleting them permanently
+
+    returns:
+        Dictionary: file id mapped to {"success": Bool, "error": String or None}
+    """
+    async def delete_bulk(self, file_ids, trash=False):
+        return await self.run(self.client.delete_bulk, file_ids, trash=trash)
+
+    """
+    AsyncGoogleDrive(): create_folder - async version of GoogleDrive.create_folder
+
+    params:
+        folder: String - name of the folder that will be created
+        recursive: Bool - will walk down the path starting at the root and upload the contents.
+
+    returns:
+        String: - Id of the folder that is now created in Google Drive
+    """
+    async def create_folder(self, folder, recursive=False):
+        return await self.run(self.client.create_folder, folder, recursive=recursive)
+
+
+class AsyncYoutube(AsyncGoogleClient):
+
+    """
+    AsyncYoutube(): initialize_upload - async version of Youtube.initialize_upload
+
+    params:
+        options: Object - contains pertinent items for video upoload. See Youtube.initialize_upload
+        chunk_size: Integer - bytes per upload request. Must be a multiple of 256 KB
+        state_path: String - json file used to persist the resumable session, so a crashed process resumes mid-file
+        progress_callback: Function - called from the worker thread with progress, throughput and retry telemetry
+
+    returns:
+        String: video id from succesful video upload
+    """
+    async def initialize_upload(self, options, chunk_size=8 * 1024 * 1024, state_path=None, progress_callback=None):
+        return await self.run(self.client.initialize_upload, options, chunk_size=chunk_size, state_path=state_path, progress_callback=progress_callback)
@@ -0,0 +1,150 @@
+import threading
+
+"""
+DriveFileIndex: In-memory index of Google Drive file resources keyed by id, name and parent, so lookups after a
+listing need no network calls and no scans. Safe to read and update from several threads, e.g. parallel uploads.
+
+Example usage:
+    file_index = DriveFileIndex(files)
+
+    file_index.get("FILE_ID")
+    file_index.get_ids_by_name("example.mp4")
+    file_index.get_child_ids("FOLDER_ID")
+
+    file_index.add({"id": "FILE_ID", "name": "example.mp4", "parents": ["FOLDER_ID"]})
+    file_index.remove("FILE_ID")
+
+"""
+
+class DriveFileIndex:
+
+    """
+    DriveFileIndex: constructor
+
+    params:
+        files: List - Google Drive file resources to index, e.g. from files().list
+
+    returns:
+    """
+    def __init__(self, files=[]):
+        self.by_id = {}
+        self.by_name = {}
+        self.by_parent = {}
+        self.lock = threading.RLock()
+        for file in files:
+            self.add(file)
+
+    """
+    DriveFileIndex: add - adds a file resource, replacing the entry with the same id
+
+    params:
+        file: Dictionary - Google Drive file resource with at least an id
+
+    returns:
+    """
+    def add(self, file):
+        file_id = file['id']
+        with self.lock:
+            if file_id in self.by_id:
+                self.remove(file_id)
+            self.by_id[file_id] = file
+            # dictionaries keep insertion order and remove in O(1), unlike lists
+            self.by_name.setdefault(file.get('name'), {})[file_id] = None
+            for parent_id in file.get('parents') or []:
+                self.by_parent.setdefault(parent_id, {})[file_id] = None
+
+    """
+    DriveFileIndex: remove - removes a file resource
+
+    params:
+        file_id: String - ID of the file on Google Drive
+
+    returns:
+        Dictionary: the removed file resource, or None if it was not indexed
+    """
+    def remove(self, file_id):
+        with self.lock:
+            file = self.by_id.pop(file_id, None)
+            if file is None:
+                return None
+            self.discard(self.by_name, file.get('name'), file_id)
+            for parent_id in file.get('parents') or []:
+                self.discard(self.by_parent, parent_id, file_id)
+            return file
+
+    """
+    DriveFileIndex: discard - removes a file id from one bucket of a lookup and drops the bucket once it is empty
+
+    params:
+        lookup: Dictionary - by_name or by_parent
+        key: String - name or parent id
+        file_id: String - ID of the file on Google Drive
+
+    returns:
+    """
+    def discard(self, lookup, key, file_id):
+        file_ids = lookup.get(key)
+        if file_ids is None:
+            return
+        file_ids.pop(file_id, None)
+        if not file_ids:
+            del lookup[key]
+
+    """
+    DriveFileIndex: get - returns the file resource for an id
+
+    params:
+        file_id: String - ID of the file on Google Drive
+
+    returns:
+        Dictionary: file resource, or None if it is not indexed
+    """
+    def get(self, file_id):
+        with self.lock:
+            return self.by_id.get(file_id)
+
+    """
+    DriveFileIndex: get_ids_by_name - returns the ids of every file with a name
+
+    params:
+        name: String - name of the file on Google Drive
+
+    returns:
+        List: file id(s) because there can be multiple instances of a file with the same name
+    """
+    def get_ids_by_name(self, name):
+        with self.lock:
+            return list(self.by_name.get(name, ()))
+
+    """
+    DriveFileIndex: get_child_ids - returns the ids of the files directly inside a folder
+
+    params:
+        parent_id: String - ID of the folder on Google Drive
+
+    returns:
+        List: file id(s) of the folder contents
+    """
+    def get_child_ids(self, parent_id):
+        with self.lock:
+            return list(self.by_parent.get(parent_id, ()))
+
+    """
+    DriveFileIndex: files - returns every indexed file resource
+
+    params:
+
+    returns:
+        List: file resources in the order they were added
+    """
+    def files(self):
+        with self.lock:
+            return list(self.by_id.values())
+
+    def __len__(self):
+        with self.lock:
+            return len(self.by_id)
+
+    def __contains__(self, file_id):
+        with self.lock:
+            return file_id in self.by_id
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024 # bytes read per update while hashing, so large files are never fully in memory
+
+"""
+FileHashCache: Cache of local file MD5 hashes keyed by path, modification time and size, so unchanged files are not
+hashed again. Can be persisted to a json file between runs.
+
+Example usage:
+    hash_cache = FileHashCache("./hash_cache.json")
+
+    md5 = hash_cache.md5("./example.mp4")
+    hash_cache.save()
+
+"""
+
+"""
+FileHashCache: md5_file - returns the hex MD5 of a local file without caching it, reading it in chunks
+
+params:
+    file_path: String - path of the local file
+
+returns:
+    String: hex MD5 digest, comparable with the md5Checksum of a Google Drive file
+"""
+def md5_file(file_path):
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        chunk = f.read(HASH_CHUNK_SIZE)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(HASH_CHUNK_SIZE)
+    return digest.hexdigest()
+
+
+class FileHashCache:
+
+    """
+    FileHashCache: constructor
+
+    params:
+        path: String - json file the cache is loaded from and saved to. Defaults to None (memory only)
+
+    returns:
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    """
+    FileHashCache: md5 - returns the hex MD5 of a local file, hashing it only if its modification time or size changed
+
+    params:
+        file_path: String - path of the local file
+
+    returns:
+        String: hex MD5 digest, comparable with the md5Checksum of a Google Drive file
+    """
+    def md5(self, file_path):
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+
+        md5 = md5_file(key)
+        with self.lock:
+            self.entries[key] = [stat.st_mtime_ns, stat.st_size, md5]
+        return md5
+
+    """
+    FileHashCache: save - writes the cache to its json file. Does nothing for a memory only cache
+
+    params:
+
+    returns:
+    """
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            entries = dict(self.entries)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temporary_path, self.path)
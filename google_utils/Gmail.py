@@ -3,14 +3,16 @@ import re
 import sys
 import time
 import uuid
+import json
 import base64
+import binascii
+import itertools
+import tempfile
 import httplib2
 from email import message
 from mimetypes import MimeTypes
 from posixpath import expanduser
 from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from email.mime.audio import MIMEAudio
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from apiclient import discovery
@@ -19,6 +21,38 @@ from oauth2client import client
 from oauth2client import tools
 from oauth2client.file import Storage
 from oauth2client.client import flow_from_clientsecrets
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from GmailMessage import GmailMessage
+from GmailSearchMatcher import GmailSearchMatcher
+from GmailSearchResult import GmailSearchResult
+from HttpPool import HttpPool
+from RateLimiter import RateLimiter
+from GoogleRequests import GoogleClient, MAX_BATCH_SIZE, execute_batch
+DEFAULT_BATCH_SIZE = 50 # Gmail rate limits batches larger than 50 requests
+MAX_PAGE_SIZE = 500 # largest maxResults accepted by users().messages().list
+DEFAULT_PAGE_SIZE = 100
+METADATA_HEADERS = ['Subject', 'From', 'To'] # headers pulled by the metadata phase of a two phase fetch
+QUOTE_DELIMITERS = {'double_quote': '"', 'single_quote': "'"} # value is wrapped in the quote character
+LINE_DELIMITERS = {'equals': '=', 'colon': ':'} # value follows the character up to the end of the line
+DEFAULT_DECODE_CHUNK_SIZE = 4 * 256 * 1024 # base64 characters decoded per write. Must be a multiple of 4
+DEFAULT_ATTACHMENT_WORKERS = 4
+DEFAULT_MAX_WORKERS = 8
+MAX_BULK_MODIFY_SIZE = 1000 # most ids accepted by users().messages().batchModify and batchDelete
+BASE64_PADDING = (b'', b'===', b'==', b'=') # padding for unpadded base64, indexed by length % 4
+BASE64_FILL = (b'', b'AAA', b'AA', b'A') # zero bits that round broken base64 up to a multiple of 4, indexed by length % 4
+URLSAFE_TO_STANDARD_BASE64 = bytes.maketrans(b'-_', b'+/')
+BASE64_NORMALIZE_PATTERNS = {b'+/': re.compile(rb'[^a-zA-Z0-9+/]+')} # compiled per altchars on first use by decode_base64
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+CONTENT_TYPE_CHARSETS = {None: 'utf-8'} # Content-Type header value to charset. The same few values repeat across messages
+MAX_CONTENT_TYPE_CHARSETS = 1024
+DECODED_HEADERS = frozenset(['Subject', 'From', 'To', 'Content-Type'])
+ATTACHMENT_ENCODE_CHUNK_SIZE = 57 * 16 * 1024 # bytes read per attachment chunk. A multiple of 57 keeps base64 lines at 76 characters
+RAW_MESSAGE_MAX_SIZE = 5 * 1024 * 1024 # messages up to this size are sent inline as "raw", larger ones with a resumable upload
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024 # bytes per resumable upload request. Must be a multiple of 256 KB
+DEFAULT_SEND_BATCH_SIZE = 10 # messages per batch in send_messages_bulk. Sends are expensive, so keep batches small
+DEFAULT_SENDS_PER_SECOND = 2 # messages().send costs 100 quota units and each user gets 250 units per second
+DEFAULT_SEND_RETRIES = 3
 
 """
 Gmail: Class for interacting with a gmail account programmatically 
@@ -28,7 +62,7 @@ Make the program that is using it set the application name and secrets
 file path and call auth explicitly.
 """
 
-class Gmail:
+class Gmail(GoogleClient):
 
 
     """
@@ -41,6 +75,8 @@ class Gmail:
         scopes: String - google developer scope. Example: 'https://mail.google.com/'
         client_secret_file_path: String - path to google creds json from google developer account
         application_name: String - google developer application name
+        message_cache: MessageCache - optional cache of parsed messages keyed by message id. Cached messages are not downloaded or decoded again
+        max_workers: Integer - when set, per-message operations run on a thread pool of this size, one authorized http client per thread
 
     """
     def __init__(
@@ -48,16 +84,24 @@ class Gmail:
         scopes = 'https://mail.google.com/',
         client_secret_file_path = './client_secrets.json',
         application_name = '',
+        message_cache = None,
+        max_workers = None,
     ):
         self.scopes = scopes
         self.client_secret_file_path = client_secret_file_path
         self.application_name = application_name
         self.message_ids = []
         self.message_contents = []
+        self.message_errors = {}
+        self.history_id = None
+        self.message_cache = message_cache
+        self.max_workers = max_workers
 
         credentials = self.get_credentials()
         http = credentials.authorize(httplib2.Http())
         self.service = discovery.build('gmail', 'v1', http=http)
+        self.credentials = credentials
+        self.http_pool = HttpPool(credentials, max_workers=max_workers or DEFAULT_MAX_WORKERS)
 
 
     """
@@ -107,55 +151,119 @@ class Gmail:
 
 
     """
-    Gmail(): create_message_with_attachment - Create a message for an email.
+    Gmail(): create_message_with_attachment - Create a message with one or more attachments for an email.
+    The whole message is base64 encoded into "raw", so use send_message_with_attachments for large files
 
     params:
-        sender: String - Email address of the sender.
         to: String - Email address of the receiver.
         subject: String - The subject of the email message.
         message_text: String - The text of the email message.
-        file: String - The path to the file to be attached.
+        file: String or List - The path, or list of paths, to the files to be attached.
 
     returns:
-        An object containing a base64url encoded email object.
+        Dictionary (object): - email safe message string stored in item "raw"
+    """
+    def create_message_with_attachment(self, to, subject, message_text, file):
+        with tempfile.SpooledTemporaryFile(max_size=RAW_MESSAGE_MAX_SIZE) as fh:
+            self.write_mime_message(fh=fh, to=to, subject=subject, message_text=message_text, files=file)
+            fh.seek(0)
+            return {
+                'raw': base64.urlsafe_b64encode(fh.read()).decode("utf-8")
+            }
+
+
+    """
+    Gmail(): write_mime_message - writes a multipart message with attachments to a binary file object.
+    Headers and the text part are built by the email package. Attachments are base64 encoded straight from disk
+    in chunks, so only one chunk of each file is in memory at a time
+
+    params:
+        fh: File object - binary file object the message is written to
+        to: String - Email address of the receiver.
+        subject: String - The subject of the email message.
+        message_text: String - The text of the email message.
+        files: String or List - The path, or list of paths, to the files to be attached.
+
+    returns:
+        Integer: number of bytes written
     """
-    def create_message_with_attachment(to, subject, message_text, file):
+    def write_mime_message(self, fh, to, subject, message_text, files):
+        if isinstance(files, str):
+            files = [files]
 
         message = MIMEMultipart()
         message['To'] = to
         message['Subject'] = subject
-
-        msg = MIMEText(message_text)
-        message.attach(msg)
+        message.attach(MIMEText(message_text))
 
         mime_types = MimeTypes()
-        content_type, encoding = mime_types.guess_type(file)
-
-        if content_type is None or encoding is not None:
-            content_type = 'application/octet-stream'
-        main_type, sub_type = content_type.split('/', 1)
-        if main_type == 'text':
-            fp = open(file, 'rb')
-            msg = MIMEText(fp.read(), _subtype=sub_type)
-            fp.close()
-        elif main_type == 'image':
-            fp = open(file, 'rb')
-            msg = MIMEImage(fp.read(), _subtype=sub_type)
-            fp.close()
-        elif main_type == 'audio':
-            fp = open(file, 'rb')
-            msg = MIMEAudio(fp.read(), _subtype=sub_type)
-            fp.close()
-        else:
-            fp = open(file, 'rb')
+        placeholders = {}
+        for file in files:
+            content_type, encoding = mime_types.guess_type(file)
+            if content_type is None or encoding is not None:
+                content_type = 'application/octet-stream'
+            main_type, sub_type = content_type.split('/', 1)
+
+            # the part only holds a placeholder. The file is encoded in its place when the message is written
+            placeholder = "ATTACHMENT-{}".format(uuid.uuid4().hex)
+            placeholders[placeholder] = file
             msg = MIMEBase(main_type, sub_type)
-            msg.set_payload(fp.read())
-            fp.close()
-        filename = os.path.basename(file)
-        msg.add_header('Content-Disposition', 'attachment', filename=filename)
-        message.attach(msg)
+            msg.set_payload(placeholder)
+            msg['Content-Transfer-Encoding'] = 'base64'
+            msg.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file))
+            message.attach(msg)
+
+        written = 0
+        segments = re.split("(ATTACHMENT-[0-9a-f]{32})", message.as_string())
+        for segment in segments:
+            file = placeholders.get(segment)
+            if file is None:
+                data = segment.encode("utf-8")
+                fh.write(data)
+                written += len(data)
+                continue
+            with open(file, 'rb') as attachment:
+                chunk = attachment.read(ATTACHMENT_ENCODE_CHUNK_SIZE)
+                while chunk:
+                    data = base64.encodebytes(chunk)
+                    fh.write(data)
+                    written += len(data)
+                    chunk = attachment.read(ATTACHMENT_ENCODE_CHUNK_SIZE)
+        return written
+
+
+    """
+    Gmail(): send_message_with_attachments - Send an email message with one or more attachments.
+    The message is written to a temporary file and sent with a resumable media upload when it is larger than
+    RAW_MESSAGE_MAX_SIZE, so memory stays flat for large attachments
+
+    params:
+        to: String - Email address of the receiver.
+        subject: String - The subject of the email message.
+        message_text: String - The text of the email message.
+        files: String or List - The path, or list of paths, to the files to be attached.
+        chunk_size: Integer - bytes sent per upload request. Must be a multiple of 256 KB
 
-        return {'raw': base64.urlsafe_b64encode(message.as_string())}
+    returns:
+        Dictionary (object): Sent message object
+    """
+    def send_message_with_attachments(self, to, subject, message_text, files, chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE):
+        with tempfile.TemporaryFile() as fh:
+            size = self.write_mime_message(fh=fh, to=to, subject=subject, message_text=message_text, files=files)
+            fh.seek(0)
+            if size <= RAW_MESSAGE_MAX_SIZE:
+                return self.send_message({'raw': base64.urlsafe_b64encode(fh.read()).decode("utf-8")})
+
+            try:
+                media = MediaIoBaseUpload(fh, mimetype='message/rfc822', chunksize=chunk_size, resumable=True)
+                request = self.service.users().messages().send(userId='me', body={}, media_body=media)
+                message = None
+                while message is None:
+                    status, message = request.next_chunk(http=self.get_thread_http())
+            except Exception as e: 
+                raise Exception("Error: issue occured while sending message: {}".format(e))
+            print("Sent message id: {}".format(message.get('id')))
+            return message
 
     
     """
@@ -170,44 +278,587 @@ class Gmail:
     def send_message(self, message):
         try:
             message = (self.service.users().messages().send(userId='me', body=message)
-               .execute())
+               .execute(http=self.get_thread_http()))
             print("Sent message id: {}".format(message.get('id')))
             return message
         except Exception as e: 
             raise Exception("Error: issue occured while sending message: {}".format(e))
 
     
+    """
+    Gmail(): send_messages_bulk - sends a templated message to many recipients. Messages are built lazily, batch_size
+    recipients at a time, sent in Google batch requests under a per second rate limit, and sends that fail with a
+    rate limit or server error are retried with exponential backoff
+
+    params:
+        recipients: Iterable - email address strings, or dictionaries with a "to" email address and any template fields
+        subject: String - subject template. Filled in with str.format_map, so literal braces must be doubled
+        message_text: String - message text template. Filled in with str.format_map, so literal braces must be doubled
+        batch_size: Integer - number of messages per batch request
+        messages_per_second: Number - send rate used when no rate_limiter is passed in
+        rate_limiter: RateLimiter - shared rate limiter, e.g. when several campaigns send from the same account
+        max_retries: Integer - number of times a retriable failure is sent again
+
+    returns:
+        List: {"to": String, "success": Bool, "message_id": String or None, "error": String or None} for every recipient in order
+    """
+    def send_messages_bulk(self, recipients, subject, message_text, batch_size=DEFAULT_SEND_BATCH_SIZE, messages_per_second=DEFAULT_SENDS_PER_SECOND, rate_limiter=None, max_retries=DEFAULT_SEND_RETRIES):
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(rate=messages_per_second, capacity=batch_size)
+
+        results = []
+        recipients = iter(recipients)
+        while True:
+            chunk = list(itertools.islice(recipients, batch_size))
+            if not chunk:
+                break
+
+            pending = []
+            for recipient in chunk:
+                fields = {"to": recipient} if isinstance(recipient, str) else recipient
+                result = {"to": fields.get("to"), "success": False, "message_id": None, "error": None}
+                results.append(result)
+                try:
+                    message = self.create_message(to=fields["to"], subject=subject.format_map(fields), message_text=message_text.format_map(fields))
+                except Exception as e:
+                    result["error"] = "Error: unable to build message: {}".format(e)
+                    continue
+                pending.append((result, message))
+
+            for attempt in range(max_retries + 1):
+                if not pending:
+                    break
+                if attempt > 0:
+                    time.sleep(2 ** attempt)
+                rate_limiter.acquire(len(pending))
+                requests = [self.service.users().messages().send(userId='me', body=message) for result, message in pending]
+                responses, errors = self.execute_batch(requests=requests, batch_size=batch_size)
+
+                retry = []
+                for index, (result, message) in enumerate(pending):
+                    if index in responses:
+                        result["success"] = True
+                        result["message_id"] = responses[index].get("id")
+                        result["error"] = None
+                    else:
+                        result["error"] = str(errors.get(index))
+                        if self.is_retriable_error(errors.get(index)):
+                            retry.append((result, message))
+                pending = retry
+
+        return results
+
+
     """
     Gmail(): pull_and_set_message_ids - loop through max_results number of message ids and set class variable message_ids eqaul to the ids
 
     params:
-        max_results: Integer - number of (most recent) emails to pull and set ids for
+        max_results: Integer - number of (most recent) emails to pull and set ids for. None pulls every matching message
+        q: String - Gmail search query to filter messages server side. Example: 'from:email@gmail.com is:unread'
+        label_ids: List - only pull messages that have all of these label ids
+        page_size: Integer - number of message ids requested per page
 
     returns:
     """
-    def pull_and_set_message_ids(self, max_results=5):
-        self.message_ids = []
-        result = self.service.users().messages().list(userId='me', maxResults=max_results).execute()
-        messages = result.get('messages')
-        for message in messages:
-            if message.get("id"):
-                self.message_ids.append(message.get("id"))
+    def pull_and_set_message_ids(self, max_results=5, q=None, label_ids=None, page_size=DEFAULT_PAGE_SIZE):
+        self.message_ids = list(self.list_message_ids(max_results=max_results, q=q, label_ids=label_ids, page_size=page_size))
+
+
+    """
+    Gmail(): list_message_id_pages - generator that follows nextPageToken one page ahead and yields one page of message ids at a time
+
+    params:
+        max_results: Integer - total number of message ids to yield. None yields every matching message
+        q: String - Gmail search query to filter messages server side
+        label_ids: List - only list messages that have all of these label ids
+        page_size: Integer - number of message ids requested per page. Capped at MAX_PAGE_SIZE
+
+    returns:
+        Generator: yields a List of message ids per page. The next page is requested on the http pool as soon as the
+        current one arrives, so it is in flight while the caller works on the current page. At most one page is prefetched
+    """
+    def list_message_id_pages(self, max_results=None, q=None, label_ids=None, page_size=DEFAULT_PAGE_SIZE):
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+        def list_page(page_token, page_max_results):
+            params = {
+                'userId': 'me',
+                'maxResults': page_max_results,
+            }
+            if q:
+                params['q'] = q
+            if label_ids:
+                params['labelIds'] = label_ids
+            if page_token:
+                params['pageToken'] = page_token
+            try:
+                return self.service.users().messages().list(**params).execute(http=self.get_thread_http())
+            except Exception as e:
+                raise Exception("Error: unable to list messages through google API call: {}".format(e))
+
+        remaining = max_results
+        next_page = None
+        try:
+            result = list_page(None, page_size if remaining is None else min(page_size, remaining))
+            while True:
+                message_ids = [message.get("id") for message in result.get('messages', []) if message.get("id")]
+                if remaining is not None:
+                    message_ids = message_ids[:remaining]
+                    remaining -= len(message_ids)
+
+                page_token = result.get('nextPageToken')
+                if page_token and (remaining is None or remaining > 0):
+                    next_page = self.http_pool.submit(list_page, page_token, page_size if remaining is None else min(page_size, remaining))
+                if message_ids:
+                    yield message_ids
+                if next_page is None:
+                    break
+                result = next_page.result()
+                next_page = None
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+
+    """
+    Gmail(): list_message_ids - generator over message ids across every page returned by list_message_id_pages
+
+    params:
+        max_results: Integer - total number of message ids to yield. None yields every matching message
+        q: String - Gmail search query to filter messages server side
+        label_ids: List - only list messages that have all of these label ids
+        page_size: Integer - number of message ids requested per page
+
+    returns:
+        Generator: yields message ids (String), newest first
+    """
+    def list_message_ids(self, max_results=None, q=None, label_ids=None, page_size=DEFAULT_PAGE_SIZE):
+        for page in self.list_message_id_pages(max_results=max_results, q=q, label_ids=label_ids, page_size=page_size):
+            for message_id in page:
+                yield message_id
 
     
+    """
+    Gmail(): get_mailbox_history_id - returns the current historyId of the mailbox
+
+    params:
+
+    returns:
+        String: historyId that later users().history().list calls can start from
+    """
+    def get_mailbox_history_id(self):
+        try:
+            profile = self.service.users().getProfile(userId='me').execute(http=self.get_thread_http())
+        except Exception as e:
+            raise Exception("Error: unable to get mailbox profile through google API call: {}".format(e))
+        return profile.get("historyId")
+
+
+    """
+    Gmail(): list_message_ids_added_since - lists ids of messages added to the mailbox after a historyId
+
+    params:
+        history_id: String - historyId to start from
+        label_id: String - only return messages that carry this label
+        page_size: Integer - number of history records requested per page
+
+    returns:
+        Tuple: (List of new message ids newest first, String historyId to start the next call from).
+        The id list is None if history_id is too old for Gmail to replay and a full sync is needed.
+    """
+    def list_message_ids_added_since(self, history_id, label_id="INBOX", page_size=DEFAULT_PAGE_SIZE):
+        message_ids = []
+        seen = set()
+        latest_history_id = history_id
+        page_token = None
+        while True:
+            params = {
+                'userId': 'me',
+                'startHistoryId': history_id,
+                'historyTypes': ['messageAdded'],
+                'maxResults': max(1, min(page_size, MAX_PAGE_SIZE)),
+            }
+            if label_id:
+                params['labelId'] = label_id
+            if page_token:
+                params['pageToken'] = page_token
+
+            try:
+                result = self.service.users().history().list(**params).execute(http=self.get_thread_http())
+            except HttpError as e:
+                if e.resp.status == 404: # startHistoryId is out of date or invalid
+                    return None, history_id
+                raise Exception("Error: unable to list history through google API call: {}".format(e))
+            except Exception as e:
+                raise Exception("Error: unable to list history through google API call: {}".format(e))
+
+            for history in result.get('history', []):
+                for added in history.get('messagesAdded', []):
+                    message_id = added.get('message', {}).get('id')
+                    if message_id and message_id not in seen:
+                        seen.add(message_id)
+                        message_ids.append(message_id)
+            latest_history_id = result.get('historyId', latest_history_id)
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+        # history is returned oldest first. Match messages().list ordering
+        message_ids.reverse()
+        return message_ids, latest_history_id
+
+
+    """
+    Gmail(): pull_and_set_new_message_ids - incremental version of pull_and_set_message_ids. Sets message_ids to the messages added since the last call
+
+    The first call (or a call after the recorded history expired) falls back to the newest max_results messages
+    and records the mailbox historyId. Later calls only ask users().history().list for messages added since then.
+
+    params:
+        inbox: String - only return messages that carry this label
+        max_results: Integer - number of (most recent) emails to pull when there is no usable history yet
+
+    returns:
+    """
+    def pull_and_set_new_message_ids(self, inbox="INBOX", max_results=5):
+        if self.history_id:
+            message_ids, history_id = self.list_message_ids_added_since(history_id=self.history_id, label_id=inbox)
+            if message_ids is not None:
+                self.message_ids = message_ids
+                self.history_id = history_id
+                return
+
+        # record the history id before listing so nothing that arrives in between is missed
+        history_id = self.get_mailbox_history_id()
+        self.pull_and_set_message_ids(max_results=max_results, label_ids=[inbox] if inbox else None)
+        self.history_id = history_id
+
+
+    """
+    Gmail(): save_sync_state - writes the incremental sync state to a local json file
+
+    params:
+        path: String - path of the state file
+
+    returns:
+    """
+    def save_sync_state(self, path):
+        self.write_sync_state(path=path, history_id=self.history_id)
+
+
+    """
+    Gmail(): write_sync_state - writes a history id to a sync state file without touching the state of this object, e.g. for a poll scheduler with its own history id
+
+    params:
+        path: String - path of the state file
+        history_id: String - history id to save
+
+    returns:
+    """
+    def write_sync_state(self, path, history_id):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump({"history_id": history_id}, f)
+        os.replace(temporary_path, path)
+
+
+    """
+    Gmail(): load_sync_state - restores the incremental sync state written by save_sync_state
+
+    params:
+        path: String - path of the state file
+
+    returns:
+        Bool: True if state was loaded, False if the file does not exist
+    """
+    def load_sync_state(self, path):
+        if not os.path.exists(path):
+            return False
+        self.history_id = self.read_sync_state(path)
+        return True
+
+
+    """
+    Gmail(): read_sync_state - reads the history id from a sync state file without touching the state of this object
+
+    params:
+        path: String - path of the state file
+
+    returns:
+        String: saved history id, or None if the file does not exist
+    """
+    def read_sync_state(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f).get("history_id")
+
+
     """
     Gmail(): pull_and_set_message_contents_from_message_ids - loop through class variable message_ids and set class variable relevant message_contents
 
     params:
         inbox: String - Ensure message came from a specifc inbox
         users: List - Ensure message came from a specific email address
+        batch_size: Integer - when set, pull messages with Google batch requests of this size. Failures are stored in message_errors instead of raised.
+        metadata_first: Bool - two phase fetch. Filter on labels and headers from a metadata only fetch, then download full messages only for the ones that pass.
+            Messages that are filtered out are left out of message_contents instead of being added as empty objects
+        max_workers: Integer - when set (or set on the class) and batch_size is not, pull messages on a thread pool of this size.
+            Failures are stored in message_errors instead of raised.
 
     returns:
     """
-    def pull_and_set_message_contents_from_message_ids(self, inbox="INBOX", users=[]):
+    def pull_and_set_message_contents_from_message_ids(self, inbox="INBOX", users=[], batch_size=None, metadata_first=False, max_workers=None):
         self.message_contents = []
+        self.message_errors = {}
+        max_workers = max_workers or self.max_workers
 
-        for message_id in self.message_ids:
-            self.message_contents.append(self.get_message_content(message_id=message_id, inbox=inbox, users=users))
+        message_ids = self.message_ids
+        metadata_by_id = None
+        if metadata_first:
+            # the second phase reuses these responses, so cached messages are not checked a second time
+            metadata_by_id, self.message_errors = self.get_message_metadata_batch(message_ids=message_ids, batch_size=batch_size or DEFAULT_BATCH_SIZE)
+            message_ids = [message_id for message_id in message_ids if self.is_message_from_inbox_and_users(response=metadata_by_id.get(message_id), inbox=inbox, users=users)]
+
+        if batch_size:
+            self.message_contents, errors = self.get_message_contents_batch(message_ids=message_ids, inbox=inbox, users=users, batch_size=batch_size, metadata_by_id=metadata_by_id)
+            self.message_errors.update(errors)
+            return
+
+        if max_workers:
+            self.message_contents, errors = self.get_message_contents_concurrently(message_ids=message_ids, inbox=inbox, users=users, max_workers=max_workers, metadata_by_id=metadata_by_id)
+            self.message_errors.update(errors)
+            return
+
+        for message_id in message_ids:
+            metadata = metadata_by_id.get(message_id) if metadata_by_id else None
+            self.message_contents.append(self.get_message_content(message_id=message_id, inbox=inbox, users=users, metadata=metadata))
+
+
+    """
+    Gmail(): get_message_contents_batch - pulls many messages through Google batch requests and parses them like get_message_content
+
+    params:
+        message_ids: List - message ids provided by Google API
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        batch_size: Integer - number of messages per batch request. Capped at MAX_BATCH_SIZE
+        metadata_by_id: Dictionary - metadata responses already fetched, e.g. by get_message_metadata_batch. Cached messages found here are not checked again
+
+    returns:
+        Tuple: (List of message contents in the same order as message_ids, Dictionary of message id to the exception raised for it)
+    """
+    def get_message_contents_batch(self, message_ids, inbox="INBOX", users=[], batch_size=DEFAULT_BATCH_SIZE, metadata_by_id=None):
+        message_ids = list(message_ids)
+        metadata_by_id = metadata_by_id or {}
+        cached_contents = {}
+        uncached_indexes = []
+        for index, message_id in enumerate(message_ids):
+            cached_content = self.get_cached_message_content(message_id=message_id)
+            if cached_content is None:
+                uncached_indexes.append(index)
+            else:
+                cached_contents[index] = cached_content
+
+        # cached messages still need their current labels, which the cheap metadata format provides
+        cached_indexes = [index for index in cached_contents if message_ids[index] not in metadata_by_id]
+        requests = [self.get_message_metadata_request(message_id=message_ids[index]) for index in cached_indexes]
+        requests += [self.service.users().messages().get(userId='me', id=message_ids[index]) for index in uncached_indexes]
+        request_indexes = cached_indexes + uncached_indexes
+        batch_responses, batch_errors = self.execute_batch(requests=requests, batch_size=batch_size)
+        responses = {request_indexes[position]: response for position, response in batch_responses.items()}
+        for index in cached_contents:
+            if message_ids[index] in metadata_by_id:
+                responses[index] = metadata_by_id[message_ids[index]]
+        errors = {message_ids[request_indexes[position]]: error for position, error in batch_errors.items()}
+
+        message_contents = []
+        for index, message_id in enumerate(message_ids):
+            if index not in responses:
+                continue
+            if index in cached_contents:
+                is_wanted = self.is_message_from_inbox_and_users(response=responses[index], inbox=inbox, users=users)
+                message_contents.append(cached_contents[index] if is_wanted else dict())
+                continue
+            try:
+                message_contents.append(self.parse_message_content(message_id=message_id, response=responses[index], inbox=inbox, users=users))
+            except Exception as e:
+                errors[message_id] = e
+
+        return message_contents, errors
+
+
+    """
+    Gmail(): get_message_contents_concurrently - pulls many messages with get_message_content on a bounded thread pool
+
+    params:
+        message_ids: List - message ids provided by Google API
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        metadata_first: Bool - check the filters against a metadata only fetch before downloading each full message
+        max_workers: Integer - number of messages pulled at the same time. Defaults to the class max_workers
+        metadata_by_id: Dictionary - metadata responses already fetched, e.g. by get_message_metadata_batch. Used instead of fetching metadata again
+
+    returns:
+        Tuple: (List of message contents in the same order as message_ids, Dictionary of message id to the exception raised for it)
+    """
+    def get_message_contents_concurrently(self, message_ids, inbox="INBOX", users=[], metadata_first=False, max_workers=None, metadata_by_id=None):
+        message_ids = list(message_ids)
+        metadata_by_id = metadata_by_id or {}
+        message_contents, errors = self.map_message_ids(
+            lambda message_id: self.get_message_content(message_id=message_id, inbox=inbox, users=users, metadata_first=metadata_first, metadata=metadata_by_id.get(message_id)),
+            message_ids=message_ids,
+            max_workers=max_workers,
+        )
+        return [message_content for message_id, message_content in zip(message_ids, message_contents) if message_id not in errors], errors
+
+
+    """
+    Gmail(): trash_messages_concurrently - moves many messages to the trash folder on a bounded thread pool
+
+    params:
+        message_ids: List - message ids provided by Google API
+        max_workers: Integer - number of messages trashed at the same time. Defaults to the class max_workers
+
+    returns:
+        Tuple: (List of trashed message objects in the same order as message_ids with None for failures, Dictionary of message id to the exception raised for it)
+    """
+    def trash_messages_concurrently(self, message_ids, max_workers=None):
+        return self.map_message_ids(
+            lambda message_id: self.service.users().messages().trash(userId='me', id=message_id).execute(http=self.get_thread_http()),
+            message_ids=message_ids,
+            max_workers=max_workers,
+        )
+
+
+    """
+    Gmail(): save_attachments_from_message_ids - downloads the attachments of many messages on a bounded thread pool
+
+    params:
+        message_ids: List - message ids provided by Google API
+        path_for_attachment: String - path to where the files will be saved. Defaults to current directory.
+        avoid_overwrite: Bool - prefix saved file names with a uuid so existing files are not overwritten
+        max_workers: Integer - number of messages handled at the same time. Defaults to the class max_workers
+
+    returns:
+        Tuple: (List of saved path lists in the same order as message_ids with None for failures, Dictionary of message id to the exception raised for it)
+    """
+    def save_attachments_from_message_ids(self, message_ids, path_for_attachment=".", avoid_overwrite=True, max_workers=None):
+        return self.map_message_ids(
+            # one message per worker, its attachments saved in turn, so the outer pool bounds every download
+            lambda message_id: self.save_attachments_from_message_id(message_id=message_id, path_for_attachment=path_for_attachment, avoid_overwrite=avoid_overwrite, max_workers=1),
+            message_ids=message_ids,
+            max_workers=max_workers,
+        )
+
+
+    """
+    Gmail(): map_message_ids - calls function for every message id on the http pool's bounded thread pool
+
+    params:
+        function: Function - called with one message id. Must execute its requests with http=self.get_thread_http()
+        message_ids: List - message ids provided by Google API
+        max_workers: Integer - maximum number of threads. Defaults to the class max_workers
+
+    returns:
+        Tuple: (List of results in the same order as message_ids with None for failed calls, Dictionary of message id to the exception raised for it)
+    """
+    def map_message_ids(self, function, message_ids, max_workers=None):
+        message_ids = list(message_ids)
+        results, errors = self.http_pool.map(function, message_ids, max_workers=max_workers or self.max_workers or DEFAULT_MAX_WORKERS)
+        return results, {message_ids[index]: error for index, error in errors.items()}
+
+
+    """
+    Gmail(): execute_batch - executes a list of google API requests through Google batch requests with GoogleRequests.execute_batch
+
+    params:
+        requests: List - unexecuted google API request objects
+        batch_size: Integer - number of requests per batch request. Capped at MAX_BATCH_SIZE
+
+    returns:
+        Tuple: (Dictionary of request index to response, Dictionary of request index to the exception raised for it)
+    """
+    def execute_batch(self, requests, batch_size=DEFAULT_BATCH_SIZE):
+        return execute_batch(self.service, requests, batch_size=batch_size, http=self.get_thread_http())
+
+
+    """
+    Gmail(): filter_message_ids_by_metadata - first phase of a two phase fetch. Pulls only labels and Subject/From/To headers and applies the inbox and users filters
+
+    params:
+        message_ids: List - message ids provided by Google API
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+        batch_size: Integer - number of messages per batch request
+
+    returns:
+        Tuple: (List of message ids that passed the filters in their original order, Dictionary of message id to the exception raised for it)
+    """
+    def filter_message_ids_by_metadata(self, message_ids, inbox="INBOX", users=[], batch_size=DEFAULT_BATCH_SIZE):
+        message_ids = list(message_ids)
+        metadata_by_id, errors = self.get_message_metadata_batch(message_ids=message_ids, batch_size=batch_size)
+        filtered_message_ids = [message_id for message_id in message_ids if self.is_message_from_inbox_and_users(response=metadata_by_id.get(message_id), inbox=inbox, users=users)]
+        return filtered_message_ids, errors
+
+
+    """
+    Gmail(): get_message_metadata_batch - pulls the labels and Subject/From/To headers of many messages through Google batch requests
+
+    params:
+        message_ids: List - message ids provided by Google API
+        batch_size: Integer - number of messages per batch request
+
+    returns:
+        Tuple: (Dictionary of message id to its metadata response, Dictionary of message id to the exception raised for it)
+    """
+    def get_message_metadata_batch(self, message_ids, batch_size=DEFAULT_BATCH_SIZE):
+        message_ids = list(message_ids)
+        requests = [self.get_message_metadata_request(message_id=message_id) for message_id in message_ids]
+        responses, errors = self.execute_batch(requests=requests, batch_size=batch_size)
+        return {message_ids[index]: response for index, response in responses.items()}, {message_ids[index]: error for index, error in errors.items()}
+
+
+    """
+    Gmail(): get_message_metadata_request - builds a metadata only get request for a message. Only labelIds and the Subject/From/To headers are returned
+
+    params:
+        message_id: String - message id provided by Google API
+
+    returns:
+        unexecuted google API request object
+    """
+    def get_message_metadata_request(self, message_id):
+        return self.service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='metadata',
+            metadataHeaders=METADATA_HEADERS,
+            fields='id,labelIds,payload/headers',
+        )
+
+
+    """
+    Gmail(): is_message_from_inbox_and_users - checks a message resource (full or metadata format) against the inbox and users filters
+
+    params:
+        response: Dictionary - message resource returned by a users().messages().get call
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+
+    returns:
+        Bool: True if the message carries the inbox label and, when users is set, its From header contains one of the users
+    """
+    def is_message_from_inbox_and_users(self, response, inbox="INBOX", users=[]):
+        if not response or not response.get("labelIds") or inbox not in response.get("labelIds"):
+            return False
+        if len(users) > 0:
+            for header in response.get("payload", {}).get("headers", []):
+                if header.get("name") == "From" and not any(user in header.get("value") for user in users):
+                    return False
+        return True
 
 
     """
@@ -216,13 +867,19 @@ class Gmail:
     params:
         message_id: String - message id provided by Google API
         path_for_attachment: String - path to where the file will be saved. Defaults to current directory.
+        avoid_overwrite: Bool - prefix saved file names with a uuid so existing files are not overwritten
+        streaming: Bool - use save_attachments_from_message_id. Walks nested parts, downloads concurrently and decodes in chunks straight to disk
 
     returns:
+        List: paths of the saved attachments when streaming, otherwise None
     """
-    def save_attachment_from_message_id(self, message_id, path_for_attachment=".", avoid_overwrite=True):
+    def save_attachment_from_message_id(self, message_id, path_for_attachment=".", avoid_overwrite=True, streaming=False):
+        if streaming:
+            return self.save_attachments_from_message_id(message_id=message_id, path_for_attachment=path_for_attachment, avoid_overwrite=avoid_overwrite)
+
         message = {}
         try:
-            message = self.service.users().messages().get(userId='me', id=message_id).execute()
+            message = self.service.users().messages().get(userId='me', id=message_id).execute(http=self.get_thread_http())
         except Exception as e: 
             raise Exception("Error: unable to get messageId through google API call: {}".format(e))
         
@@ -235,17 +892,14 @@ class Gmail:
                     else:
                         att_id = part.get('body').get('attachmentId')
                         try:
-                            att = self.service.users().messages().attachments().get(userId='me', messageId=message_id, id=att_id).execute()
+                            att = self.service.users().messages().attachments().get(userId='me', messageId=message_id, id=att_id).execute(http=self.get_thread_http())
                         except Exception as e: 
                             raise Exception("Error: unable to get attachmentId from messageId through google API call: {}".format(e))
                         data = att.get('data')
                     
                     if data:
                         file_data = base64.urlsafe_b64decode(data.encode('UTF-8'))
-                        if avoid_overwrite:
-                            path = path_for_attachment+"/"+str(uuid.uuid4())+"-"+part['filename']
-                        else:
-                            path = path_for_attachment+"/"+part['filename']
+                        path = self.get_attachment_path(path_for_attachment=path_for_attachment, filename=part['filename'], avoid_overwrite=avoid_overwrite)
 
                         with open(path, 'wb') as f:
                             f.write(file_data)
@@ -253,6 +907,122 @@ class Gmail:
                         raise Exception("Error: data not found for attachment in message that contains filename")
 
 
+    """
+    Gmail(): save_attachments_from_message_id - downloads every attachment of a message, including ones nested in multipart parts, to the specified path
+
+    Attachments are fetched concurrently, one authorized http client per worker thread, and each payload is base64 decoded
+    in fixed size chunks straight to its file, so at most max_workers encoded payloads are held in memory at once.
+    Without avoid_overwrite, attachments with the same filename are written one after another and the last one wins.
+
+    params:
+        message_id: String - message id provided by Google API
+        path_for_attachment: String - path to where the files will be saved. Defaults to current directory.
+        avoid_overwrite: Bool - prefix saved file names with a uuid so existing files are not overwritten
+        max_workers: Integer - number of attachments downloaded at the same time
+        chunk_size: Integer - number of base64 characters decoded and written at a time
+
+    returns:
+        List: paths of the saved attachments in the order they appear in the message
+    """
+    def save_attachments_from_message_id(self, message_id, path_for_attachment=".", avoid_overwrite=True, max_workers=DEFAULT_ATTACHMENT_WORKERS, chunk_size=DEFAULT_DECODE_CHUNK_SIZE):
+        try:
+            message = self.service.users().messages().get(userId='me', id=message_id).execute(http=self.get_thread_http())
+        except Exception as e: 
+            raise Exception("Error: unable to get messageId through google API call: {}".format(e))
+
+        # parts that would be written to the same path are saved in order by one worker instead of concurrently
+        paths = []
+        parts_by_path = {}
+        for part in self.get_attachment_parts(message.get("payload", {})):
+            path = self.get_attachment_path(path_for_attachment=path_for_attachment, filename=part['filename'], avoid_overwrite=avoid_overwrite)
+            paths.append(path)
+            parts_by_path.setdefault(path, []).append(part)
+
+        def save_parts(path):
+            for part in parts_by_path[path]:
+                save_part(part, path)
+            return path
+
+        def save_part(part, path):
+            data = part.get('body', {}).get('data')
+            if not data:
+                att_id = part.get('body', {}).get('attachmentId')
+                try:
+                    att = self.service.users().messages().attachments().get(userId='me', messageId=message_id, id=att_id).execute(http=self.get_thread_http())
+                except Exception as e: 
+                    raise Exception("Error: unable to get attachmentId from messageId through google API call: {}".format(e))
+                data = att.get('data')
+            if not data:
+                raise Exception("Error: data not found for attachment in message that contains filename")
+
+            self.write_base64_to_file(data=data, path=path, chunk_size=chunk_size)
+
+        saved_paths, errors = self.http_pool.map(save_parts, parts_by_path, max_workers=max_workers)
+        if errors:
+            raise errors[min(errors)]
+        return paths
+
+
+    """
+    Gmail(): get_attachment_path - builds the local path of an attachment. The filename comes from the email, so only its
+    last component is used and it can never point outside path_for_attachment
+
+    params:
+        path_for_attachment: String - path to where the file will be saved
+        filename: String - filename of the message part
+        avoid_overwrite: Bool - prefix the file name with a uuid so existing files are not overwritten
+
+    returns:
+        String: path inside path_for_attachment
+    """
+    def get_attachment_path(self, path_for_attachment, filename, avoid_overwrite=True):
+        filename = os.path.basename(filename.replace("\\", "/"))
+        if filename in ("", ".", ".."):
+            filename = "attachment"
+        if avoid_overwrite:
+            filename = str(uuid.uuid4())+"-"+filename
+        return os.path.join(path_for_attachment, filename)
+
+
+    """
+    Gmail(): get_attachment_parts - generator that walks a message payload, including nested multipart parts, and yields the parts that are attachments
+
+    params:
+        payload: Dictionary - payload of a message resource returned by a users().messages().get call
+
+    returns:
+        Generator: yields message parts (Dictionary) that have a filename
+    """
+    def get_attachment_parts(self, payload):
+        parts_to_visit = list(reversed(payload.get("parts") or []))
+        while parts_to_visit:
+            part = parts_to_visit.pop()
+            if part.get('filename'):
+                yield part
+            parts_to_visit.extend(reversed(part.get("parts") or []))
+
+
+    """
+    Gmail(): write_base64_to_file - decodes url safe base64 data to a file in fixed size chunks instead of decoding the whole payload in memory
+
+    params:
+        data: String - url safe base64 data, padding being optional
+        path: String - path of the file that will be written
+        chunk_size: Integer - number of base64 characters decoded and written at a time. Rounded down to a multiple of 4
+
+    returns:
+    """
+    def write_base64_to_file(self, data, path, chunk_size=DEFAULT_DECODE_CHUNK_SIZE):
+        chunk_size = max(4, chunk_size - chunk_size % 4)
+        with open(path, 'wb') as f:
+            for start in range(0, len(data), chunk_size):
+                chunk = data[start:start + chunk_size]
+                missing_padding = len(chunk) % 4
+                if missing_padding:
+                    chunk += '=' * (4 - missing_padding)
+                f.write(base64.urlsafe_b64decode(chunk))
+
+
     """
     Gmail(): decode_base64 - Decode base64, padding being optional.
 
@@ -267,7 +1037,11 @@ class Gmail:
     """
     def decode_base64(self, data, altchars=b'+/'):
         
-        data = re.sub(rb'[^a-zA-Z0-9%s]+' % altchars, b'', data)  # normalize
+        pattern = BASE64_NORMALIZE_PATTERNS.get(altchars)
+        if pattern is None:
+            pattern = re.compile(rb'[^a-zA-Z0-9%s]+' % re.escape(altchars))
+            BASE64_NORMALIZE_PATTERNS[altchars] = pattern
+        data = pattern.sub(b'', data)  # normalize
         missing_padding = len(data) % 4
         if missing_padding:
             data += b'='* (4 - missing_padding)
@@ -281,55 +1055,224 @@ class Gmail:
         message_id: String - message id provided by Google API
         inbox: String - Ensure message came from a specifc inbox
         users: List - Ensure message came from a specific email address
+        metadata_first: Bool - check the inbox and users filters against a metadata only fetch before downloading the full message.
+            Cached messages are always checked this way, since their labels may have changed
+        metadata: Dictionary - metadata response already fetched for the message. Used instead of a metadata fetch
 
     returns:
-        Dictionary (object): Custom object with pertinent content from a google response. 
+        GmailMessage: Custom object with pertinent content from a google response. 
     """
-    def get_message_content(self, message_id, inbox="INBOX", users=[]):
+    def get_message_content(self, message_id, inbox="INBOX", users=[], metadata_first=False, metadata=None):
+        cached_content = self.get_cached_message_content(message_id=message_id)
+        if metadata is not None or metadata_first or cached_content is not None:
+            if metadata is None:
+                try:
+                    metadata = self.get_message_metadata_request(message_id=message_id).execute(http=self.get_thread_http())
+                except Exception as e: 
+                    raise Exception("Error: unable to get message metadata through google API call: {}".format(e))
+            if not self.is_message_from_inbox_and_users(response=metadata, inbox=inbox, users=users):
+                return dict()
+            if cached_content is not None:
+                return cached_content
+
         response = {}
         try:
-            response = self.service.users().messages().get(userId='me', id=message_id).execute()
+            response = self.service.users().messages().get(userId='me', id=message_id).execute(http=self.get_thread_http())
         except Exception as e: 
             raise Exception("Error: unable to get messageId through google API call: {}".format(e))
-        
-        msg = dict()
-        if response and response.get("labelIds") and inbox in response.get("labelIds"): 
-            payload = response.get("payload")           
-            headers = payload.get("headers")
-            msg["Message-ID"] = message_id
-            
-            for header in headers:
-                if header.get("name") == "Subject":
-                    msg["Subject"] = header.get("value", "Subject has no value").replace('“','"').replace('”','"').replace("\r\n"," ")
-                if header.get("name") == "From":
-                    if len(users) > 0 and not any(user in header.get("value") for user in users):
-                        return dict()
-                    msg["From"] = header.get("value", "From has no value")
-                if header.get("name") == "To":
-                    msg["To"] = header.get("value", "To has no value")
-
-            if payload.get("body").get("data"):
-                base64_encoded_data = payload.get("body").get("data")
-                msg["Body"] = base64.urlsafe_b64decode(base64_encoded_data.encode("ASCII")).decode("utf-8")
-            elif payload.get("parts"):
-                for part in payload.get("parts"):
-                    if part.get("mimeType") == "multipart/alternative":
-                        if part.get("parts"):
-                            for inner_part in part.get("parts"):
-                                if inner_part.get("mimeType") == "text/plain":
-                                    base64_encoded_data = inner_part.get("body").get("data")
-                                    if base64_encoded_data:
-                                        msg["Body"] = base64.urlsafe_b64decode(base64_encoded_data.encode("ASCII")).decode("utf-8")
-                    elif part.get("mimeType") == "text/plain":
-                        base64_encoded_data = part.get("body").get("data")
-                        if base64_encoded_data:
-                            msg["Body"] = base64.urlsafe_b64decode(base64_encoded_data.encode("ASCII")).decode("utf-8")
+
+        return self.parse_message_content(message_id=message_id, response=response, inbox=inbox, users=users)
+
+
+    """
+    Gmail(): parse_message_content - builds custom object with pertinent content from a google message resource
+
+    params:
+        message_id: String - message id provided by Google API
+        response: Dictionary - message resource returned by a users().messages().get call
+        inbox: String - Ensure message came from a specifc inbox
+        users: List - Ensure message came from a specific email address
+
+    returns:
+        GmailMessage: Custom object with pertinent content from a google response. An empty dictionary if the message is filtered out.
+        When message_cache is set the decoded message is cached even if it is filtered out, so other filters can reuse it.
+    """
+    def parse_message_content(self, message_id, response, inbox="INBOX", users=[]):
+        is_wanted = self.is_message_from_inbox_and_users(response=response, inbox=inbox, users=users)
+        if not is_wanted and self.message_cache is None:
+            return dict()
+
+        try:
+            msg = self.decode_message_content(message_id=message_id, response=response)
+        except Exception:
+            if is_wanted:
+                raise
+            return dict()
+
+        if self.message_cache is not None:
+            self.message_cache.put(message_id, {"content": msg.to_dict()})
+        return msg if is_wanted else dict()
+
+
+    """
+    Gmail(): decode_message_content - decodes headers and text body of a google message resource without applying any filters
+
+    params:
+        message_id: String - message id provided by Google API
+        response: Dictionary - message resource returned by a users().messages().get call
+
+    returns:
+        GmailMessage: Custom object with pertinent content from a google response.
+    """
+    def decode_message_content(self, message_id, response):
+        msg = GmailMessage(message_id=message_id)
+        payload = response.get("payload")
+        content_type = None
+        for header in payload.get("headers"):
+            name = header.get("name")
+            if name not in DECODED_HEADERS:
+                continue
+            if name == "Subject":
+                msg.subject = header.get("value", "Subject has no value").replace('“','"').replace('”','"').replace("\r\n"," ")
+            elif name == "From":
+                msg.sender = header.get("value", "From has no value")
+            elif name == "To":
+                msg.to = header.get("value", "To has no value")
             else:
-                raise Exception("Error: Not able to parse email: {}".format(response))
+                content_type = header.get("value")
 
+        data = payload.get("body").get("data")
+        if not data:
+            if not payload.get("parts"):
+                raise Exception("Error: Not able to parse email: {}".format(response))
+            body_part = self.get_body_part(payload)
+            if body_part is None:
+                return msg
+            data = body_part.get("body").get("data")
+            content_type = None
+            for header in body_part.get("headers") or ():
+                if header.get("name") == "Content-Type":
+                    content_type = header.get("value")
+
+        msg.body = self.decode_body_bytes(data=self.decode_base64_body(data), content_type=content_type)
         return msg
 
 
+    """
+    Gmail(): decode_message_payloads - bulk version of decode_message_content for many raw message resources, e.g. when reparsing cached payloads
+
+    params:
+        responses: List - message resources returned by users().messages().get calls
+        message_ids: List - message ids in the same order as responses. Defaults to the id of each response
+
+    returns:
+        Tuple: (List of decoded Message-ID/Subject/From/To/Body objects in the same order as responses, Dictionary of message id to the exception raised for it)
+    """
+    def decode_message_payloads(self, responses, message_ids=None):
+        responses = list(responses)
+        if message_ids is None:
+            message_ids = [response.get("id") for response in responses]
+
+        records = []
+        errors = {}
+        decode_message_content = self.decode_message_content
+        for message_id, response in zip(message_ids, responses):
+            try:
+                records.append(decode_message_content(message_id, response))
+            except Exception as e:
+                errors[message_id] = e
+        return records, errors
+
+
+    """
+    Gmail(): get_body_part - finds the part of a message payload that holds the text body
+
+    params:
+        payload: Dictionary - payload of a message resource returned by a users().messages().get call
+
+    returns:
+        Dictionary: the last text/plain part with data (also inside multipart/alternative), or None
+    """
+    def get_body_part(self, payload):
+        body_part = None
+        for part in payload.get("parts"):
+            mime_type = part.get("mimeType")
+            if mime_type == "multipart/alternative":
+                for inner_part in part.get("parts") or ():
+                    if inner_part.get("mimeType") == "text/plain" and inner_part.get("body", {}).get("data"):
+                        body_part = inner_part
+            elif mime_type == "text/plain" and part.get("body", {}).get("data"):
+                body_part = part
+        return body_part
+
+
+    """
+    Gmail(): decode_base64_body - decodes a url safe base64 body with precompiled translation tables
+
+    Well formed data takes a single translate and binascii call. Data with characters outside the alphabet or broken
+    padding is cleaned, re-padded and decoded instead of raising.
+
+    params:
+        data: String - url safe base64 string
+
+    returns:
+        bytes: decoded body
+    """
+    def decode_base64_body(self, data):
+        encoded = data.encode("ascii", "ignore").translate(URLSAFE_TO_STANDARD_BASE64)
+        try:
+            return binascii.a2b_base64(encoded + BASE64_PADDING[len(encoded) & 3])
+        except binascii.Error:
+            pass
+
+        encoded = BASE64_NORMALIZE_PATTERNS[b'+/'].sub(b'', encoded)
+        return binascii.a2b_base64(encoded + BASE64_FILL[len(encoded) & 3])[:len(encoded) * 3 // 4]
+
+
+    """
+    Gmail(): decode_body_bytes - decodes body bytes with the charset from their Content-Type header
+
+    params:
+        data: bytes - decoded base64 body
+        content_type: String - Content-Type header value of the body part. Defaults to utf-8 when missing or without a charset
+
+    returns:
+        String: decoded text. Falls back to utf-8 with replacement characters when the charset is unknown or does not fit
+    """
+    def decode_body_bytes(self, data, content_type=None):
+        charset = CONTENT_TYPE_CHARSETS.get(content_type)
+        if charset is None:
+            match = CHARSET_PATTERN.search(content_type or "")
+            charset = match.group(1) if match else "utf-8"
+            if len(CONTENT_TYPE_CHARSETS) < MAX_CONTENT_TYPE_CHARSETS:
+                CONTENT_TYPE_CHARSETS[content_type] = charset
+        try:
+            return data.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            return data.decode("utf-8", errors="replace")
+
+
+    """
+    Gmail(): get_cached_message_content - returns the decoded content of a message from message_cache
+
+    Only the content is cached. Labels can change after a message is cached, so callers check the inbox and users
+    filters against a fresh metadata fetch before using it.
+
+    params:
+        message_id: String - message id provided by Google API
+
+    returns:
+        GmailMessage: copy of the cached content, or None if it is not cached
+    """
+    def get_cached_message_content(self, message_id):
+        if self.message_cache is None:
+            return None
+        entry = self.message_cache.get(message_id)
+        if entry is None:
+            return None
+        return GmailMessage.from_dict(entry.get("content", {}))
+
+
     """
     Gmail(): is_correct_email - checks to see if email header/body contains all non-optional phrases
 
@@ -349,25 +1292,48 @@ class Gmail:
     """
     Gmail(): get_response_string - grabs string from email text based on keyword phrase
 
+    The value is located from the start of the phrase according to item.delimiter:
+        double_quote - text between the next pair of double quotes. Example: test="value"
+        single_quote - text between the next pair of single quotes. Example: test='value'
+        equals - text after the next '=' up to the end of the line. Example: test=value
+        colon - text after the next ':' up to the end of the line. Example: test: value
+
     params:
         message_text: String - email header and body text
         item: Dictionary - contains keyword to match with user email
+        phrase_start: Integer - index of the phrase in message_text when it is already known, e.g. from GmailSearchMatcher.search
 
     returns:
         String: string that is related to the keyword phrase or default if string not found in mail
     """
-    def get_response_string(self, message_text, item):
-        response_string = ""
-        string_start = message_text.find(item.phrase)
-        while string_start < len(message_text):
-            if message_text[string_start] == '"':
-                string_start += 1
-                while string_start < len(message_text) and message_text[string_start] != '"':
-                    response_string += message_text[string_start]
-                    string_start += 1
-                break
-            string_start += 1
-        
+    def get_response_string(self, message_text, item, phrase_start=None):
+        string_start = message_text.find(item.phrase) if phrase_start is None else phrase_start
+        if string_start < 0:
+            return item.default
+
+        delimiter = getattr(item, "delimiter", "double_quote")
+        if delimiter in QUOTE_DELIMITERS:
+            quote = QUOTE_DELIMITERS[delimiter]
+            value_start = message_text.find(quote, string_start)
+            if value_start < 0:
+                return item.default
+            value_start += 1
+            value_end = message_text.find(quote, value_start)
+            if value_end < 0:
+                value_end = len(message_text)
+            response_string = message_text[value_start:value_end]
+        elif delimiter in LINE_DELIMITERS:
+            # the delimiter has to be on the same line as the phrase
+            line_end = message_text.find("\n", string_start)
+            if line_end < 0:
+                line_end = len(message_text)
+            value_start = message_text.find(LINE_DELIMITERS[delimiter], string_start, line_end)
+            if value_start < 0:
+                return item.default
+            response_string = message_text[value_start + 1:line_end].strip()
+        else:
+            raise Exception("Error: Unknown delimiter provided for item to find in email. Item is: {}".format(item))
+
         return response_string if response_string != "" else item.default
 
 
@@ -377,19 +1343,26 @@ class Gmail:
     params:
         message_text: String - email header and body text
         item: Dictionary - contains keywords to match with user email
+        phrase_positions: Dictionary - result of GmailSearchMatcher.search for message_text. When passed the message is not scanned again
 
     returns:
         response is varied based on item type. Could return string or bool. Defaults if value cannot be pulled from message
     """
-    def get_response_for_item_from_message(self, message_text, item):
+    def get_response_for_item_from_message(self, message_text, item, phrase_positions=None):
         response = item.default
         item_type = item.type
+        if phrase_positions is None:
+            phrase_found = item.phrase in message_text
+            phrase_start = None
+        else:
+            phrase_found = item.phrase in phrase_positions
+            phrase_start = phrase_positions.get(item.phrase)
 
         if item_type == "string":
-            if item.phrase in message_text:
-                response = self.get_response_string(message_text=message_text, item=item)
+            if phrase_found:
+                response = self.get_response_string(message_text=message_text, item=item, phrase_start=phrase_start)
         elif item_type == "bool":
-            response = True if item.phrase in message_text else False
+            response = phrase_found
         elif item_type == "uuid":
             response = item.phrase
         elif not item_type:
@@ -404,23 +1377,29 @@ class Gmail:
 
     params:
         items_to_match: List - list of item keywords to search for in an email
+        matcher: GmailSearchMatcher - matcher compiled from items_to_match. Defaults to the cached matcher for items_to_match
+        message_contents: List - message contents to search. Defaults to the class variable message_contents
 
     returns:
-        List: list of objects containing pertinent response data for items passed in
+        List: GmailSearchResults with pertinent response data for items passed in. Each result reads like a name/type/from/message_id/response dictionary and to_dict() returns a real one
     """
-    def get_response_from_user_email(self, items_to_match=[]):
+    def get_response_from_user_email(self, items_to_match=[], matcher=None, message_contents=None):
+        if matcher is None:
+            matcher = GmailSearchMatcher.for_items(items_to_match)
+        if message_contents is None:
+            message_contents = self.message_contents
+
         user_response = []
-        for message_content in self.message_contents:
+        for message_content in message_contents:
             combined_message_text = "{message_subject} {message_body}".format(message_subject=message_content.get("Subject"), message_body=message_content.get("Body"))
-            if self.is_correct_email(message_text=combined_message_text, items_to_match=items_to_match):
-                for item in items_to_match:
-                    user_response.append({
-                        "name": item.name,
-                        "type": item.type,
-                        "from": message_content.get("From"),
-                        "message_id": message_content.get("Message-ID"),
-                        "response": self.get_response_for_item_from_message(message_text=combined_message_text, item=item),
-                    })
+            phrase_positions = matcher.search(combined_message_text)
+            if matcher.is_correct_email(phrase_positions):
+                for item in matcher.items_to_match:
+                    user_response.append(GmailSearchResult(
+                        message=message_content,
+                        item=item,
+                        response=self.get_response_for_item_from_message(message_text=combined_message_text, item=item, phrase_positions=phrase_positions),
+                    ))
         return user_response
 
 
@@ -434,12 +1413,122 @@ class Gmail:
     """
     def trash_message(self, message_id):
         try:
-            message = (self.service.users().messages().trash(userId='me', id=message_id).execute())
+            message = (self.service.users().messages().trash(userId='me', id=message_id).execute(http=self.get_thread_http()))
             print('Message Id: %s sent to Trash.' % message['id'])
         except Exception as error:
             print('An error occurred while trashing email: %s' % error)
 
 
+    """
+    Gmail(): modify_labels_bulk - adds and removes labels on many messages with users().messages().batchModify
+
+    params:
+        message_ids: List - message ids provided by Google API
+        add_label_ids: List - label ids to add to every message
+        remove_label_ids: List - label ids to remove from every message
+        chunk_size: Integer - number of ids per batchModify call. Capped at MAX_BULK_MODIFY_SIZE
+
+    returns:
+        Dictionary: message id mapped to {"success": Bool, "error": String or None}
+    """
+    def modify_labels_bulk(self, message_ids, add_label_ids=[], remove_label_ids=[], chunk_size=MAX_BULK_MODIFY_SIZE):
+        body = {}
+        if add_label_ids:
+            body['addLabelIds'] = list(add_label_ids)
+        if remove_label_ids:
+            body['removeLabelIds'] = list(remove_label_ids)
+
+        report = {}
+        for chunk in self.chunk_message_ids(message_ids=message_ids, chunk_size=chunk_size):
+            try:
+                self.service.users().messages().batchModify(userId='me', body=dict(body, ids=chunk)).execute(http=self.get_thread_http())
+                report.update(self.build_bulk_report(message_ids=chunk))
+            except Exception as e:
+                report.update(self.build_bulk_report(message_ids=chunk, error=e))
+        return report
+
+
+    """
+    Gmail(): trash_messages_bulk - moves many messages to the trash folder with users().messages().batchModify.
+    Chunks that batchModify rejects fall back to batch requests of users().messages().trash so each id gets its own outcome
+
+    params:
+        message_ids: List - message ids provided by Google API
+        chunk_size: Integer - number of ids per batchModify call. Capped at MAX_BULK_MODIFY_SIZE
+        batch_size: Integer - number of trash calls per batch request in the fallback
+
+    returns:
+        Dictionary: message id mapped to {"success": Bool, "error": String or None}
+    """
+    def trash_messages_bulk(self, message_ids, chunk_size=MAX_BULK_MODIFY_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        report = {}
+        for chunk in self.chunk_message_ids(message_ids=message_ids, chunk_size=chunk_size):
+            try:
+                self.service.users().messages().batchModify(userId='me', body={'ids': chunk, 'addLabelIds': ['TRASH']}).execute(http=self.get_thread_http())
+                report.update(self.build_bulk_report(message_ids=chunk))
+                continue
+            except Exception:
+                pass
+
+            requests = [self.service.users().messages().trash(userId='me', id=message_id) for message_id in chunk]
+            responses, errors = self.execute_batch(requests=requests, batch_size=batch_size)
+            for index, message_id in enumerate(chunk):
+                report[message_id] = {"success": index in responses, "error": str(errors[index]) if index in errors else None}
+        return report
+
+
+    """
+    Gmail(): delete_messages_bulk - permanently deletes many messages with users().messages().batchDelete. Skips the trash and cannot be undone
+
+    params:
+        message_ids: List - message ids provided by Google API
+        chunk_size: Integer - number of ids per batchDelete call. Capped at MAX_BULK_MODIFY_SIZE
+
+    returns:
+        Dictionary: message id mapped to {"success": Bool, "error": String or None}
+    """
+    def delete_messages_bulk(self, message_ids, chunk_size=MAX_BULK_MODIFY_SIZE):
+        report = {}
+        for chunk in self.chunk_message_ids(message_ids=message_ids, chunk_size=chunk_size):
+            try:
+                self.service.users().messages().batchDelete(userId='me', body={'ids': chunk}).execute(http=self.get_thread_http())
+                report.update(self.build_bulk_report(message_ids=chunk))
+            except Exception as e:
+                report.update(self.build_bulk_report(message_ids=chunk, error=e))
+        return report
+
+
+    """
+    Gmail(): chunk_message_ids - splits message ids into unique, ordered chunks for the bulk operations
+
+    params:
+        message_ids: List - message ids provided by Google API
+        chunk_size: Integer - number of ids per chunk. Capped at MAX_BULK_MODIFY_SIZE
+
+    returns:
+        Generator: yields Lists of message ids
+    """
+    def chunk_message_ids(self, message_ids, chunk_size=MAX_BULK_MODIFY_SIZE):
+        chunk_size = max(1, min(chunk_size, MAX_BULK_MODIFY_SIZE))
+        unique_message_ids = list(dict.fromkeys(message_ids))
+        for start in range(0, len(unique_message_ids), chunk_size):
+            yield unique_message_ids[start:start + chunk_size]
+
+
+    """
+    Gmail(): build_bulk_report - builds the per id report entries for a chunk that succeeded or failed as a whole
+
+    params:
+        message_ids: List - message ids provided by Google API
+        error: Exception - error raised for the chunk. Defaults to None (success)
+
+    returns:
+        Dictionary: message id mapped to {"success": Bool, "error": String or None}
+    """
+    def build_bulk_report(self, message_ids, error=None):
+        return {message_id: {"success": error is None, "error": str(error) if error is not None else None} for message_id in message_ids}
+
+
     """
     Gmail(): poll_email_and_get_response_from_user - polls email inbox and returns object for a given email
 
@@ -449,20 +1538,38 @@ class Gmail:
         users: List - Ensure message came from a specific email address
         retry_count: Integer - number of times to retry search for email
         seconds_between_retries: Integer - number of seconds to wait before retry
+        max_results: Integer - number of (most recent) emails to check per try. With incremental, only used for the first sync
+        incremental: Bool - only fetch messages added since the previous try, using mailbox history ids
+        sync_state_path: String - file used to persist the incremental sync state so a restarted process resumes where it left off
+        scheduler: GmailPollScheduler - wait on a shared, adaptive poll loop instead of polling with a fixed sleep.
+            Waits up to retry_count * seconds_between_retries seconds. inbox, max_results, incremental and sync_state_path come from the scheduler
 
     returns:
         List: list of objects containing pertinent response data for items passed in
     """
-    def poll_email_and_get_response_from_user(self, items_to_match, inbox="INBOX", users=[], retry_count=20, seconds_between_retries=10, max_results=1):
+    def poll_email_and_get_response_from_user(self, items_to_match, inbox="INBOX", users=[], retry_count=20, seconds_between_retries=10, max_results=1, incremental=False, sync_state_path=None, scheduler=None):
         
+        if scheduler is not None:
+            return scheduler.wait_for_response(items_to_match=items_to_match, users=users, timeout=retry_count * seconds_between_retries)
+
+        if incremental and sync_state_path:
+            self.load_sync_state(sync_state_path)
+
         tries = 0
         user_response = None
+        matcher = GmailSearchMatcher.for_items(items_to_match)
         while not user_response and tries < retry_count:
             
             print("Polling email. Try #:{}".format(str(tries+1)))
-            self.pull_and_set_message_ids(max_results=max_results)
+            if incremental:
+                self.pull_and_set_new_message_ids(inbox=inbox, max_results=max_results)
+            else:
+                self.pull_and_set_message_ids(max_results=max_results)
             self.pull_and_set_message_contents_from_message_ids(inbox=inbox, users=users)
-            user_response = self.get_response_from_user_email(items_to_match=items_to_match)
+            user_response = self.get_response_from_user_email(items_to_match=items_to_match, matcher=matcher)
+            if incremental and sync_state_path:
+                # only persist once the new messages have been checked
+                self.save_sync_state(sync_state_path)
             if user_response:
                 break
             time.sleep(seconds_between_retries)
@@ -0,0 +1,105 @@
+from collections.abc import MutableMapping
+
+MESSAGE_FIELDS = {
+    "Message-ID": "message_id",
+    "Subject": "subject",
+    "From": "sender",
+    "To": "to",
+    "Body": "body",
+}
+
+"""
+GmailMessage: Compact record for a parsed Gmail message. Uses __slots__ instead of a per-message dictionary and
+still behaves like the dictionary Gmail used to return, keyed by "Message-ID", "Subject", "From", "To" and "Body".
+It is a Mapping, not a dict, so call to_dict() where a real dict is needed, e.g. for json.dumps or isinstance checks.
+
+Example usage:
+    message = GmailMessage(message_id="ID_OF_A_MESSAGE", subject="Hello", sender="email@gmail.com")
+
+    message.subject
+    message["Subject"]
+    message.get("Body", "no body")
+    json.dumps(message.to_dict())
+
+"""
+
+class GmailMessage(MutableMapping):
+
+    __slots__ = ("message_id", "subject", "sender", "to", "body")
+
+    """
+    GmailMessage: constructor - initializes the record. Fields left as None are treated as missing keys by the dictionary view
+
+    params:
+        message_id: String - message id provided by Google API
+        subject: String - Subject header
+        sender: String - From header
+        to: String - To header
+        body: String - decoded text body
+
+    returns:
+    """
+    def __init__(self, message_id=None, subject=None, sender=None, to=None, body=None):
+        self.message_id = message_id
+        self.subject = subject
+        self.sender = sender
+        self.to = to
+        self.body = body
+
+    """
+    GmailMessage: from_dict - builds a record from the dictionary format, e.g. a cached message
+
+    params:
+        content: Dictionary - object keyed by "Message-ID", "Subject", "From", "To" and "Body"
+
+    returns:
+        GmailMessage: record with the same content
+    """
+    @classmethod
+    def from_dict(cls, content):
+        return cls(
+            message_id=content.get("Message-ID"),
+            subject=content.get("Subject"),
+            sender=content.get("From"),
+            to=content.get("To"),
+            body=content.get("Body"),
+        )
+
+    """
+    GmailMessage: to_dict - returns the record in the dictionary format, e.g. for json serialization
+
+    params:
+
+    returns:
+        Dictionary: object keyed by "Message-ID", "Subject", "From", "To" and "Body" with missing fields left out
+    """
+    def to_dict(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        field = MESSAGE_FIELDS.get(key)
+        value = getattr(self, field) if field else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        field = MESSAGE_FIELDS.get(key)
+        if field is None:
+            raise KeyError("Error: GmailMessage has no field for key: {}".format(key))
+        setattr(self, field, value)
+
+    def __delitem__(self, key):
+        self[key] # raise KeyError for missing keys like a dictionary would
+        setattr(self, MESSAGE_FIELDS[key], None)
+
+    def __iter__(self):
+        for key, field in MESSAGE_FIELDS.items():
+            if getattr(self, field) is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return "GmailMessage({})".format(self.to_dict())
@@ -0,0 +1,330 @@
+import random
+import threading
+from collections import deque
+from GmailSearchMatcher import GmailSearchMatcher
+
+"""
+GmailPollScheduler: Shared poll loop for many workflows waiting on email responses. Every cycle lists and downloads
+new messages once and evaluates them for every registered waiter, so N waiting workflows cost one API listing per
+cycle instead of N. The interval drops to min_interval after new mail arrives and backs off towards max_interval,
+with jitter, while the inbox is idle.
+
+Example usage:
+    gmail = Gmail()
+    scheduler = GmailPollScheduler(gmail, min_interval=2, max_interval=60)
+
+    items = [
+        GmailSearchItem(name="Test", type=1, phrase="test=", default="default value", optional=False),
+    ]
+    user_response = scheduler.wait_for_response(items_to_match=items, users=["email@gmail.com"], timeout=600)
+
+    # or through the existing Gmail api
+    user_response = gmail.poll_email_and_get_response_from_user(items_to_match=items, scheduler=scheduler)
+
+    scheduler.stop()
+
+"""
+
+class GmailPollWaiter:
+
+    """
+    GmailPollWaiter: constructor - one workflow waiting on the scheduler for an email that matches its items
+
+    params:
+        items_to_match: List - list of GmailSearchItems to search for in an email
+        users: List - Ensure message came from a specific email address
+
+    returns:
+    """
+    def __init__(self, items_to_match, users=[]):
+        self.items_to_match = list(items_to_match)
+        self.users = list(users)
+        self.matcher = GmailSearchMatcher.for_items(self.items_to_match)
+        self.event = threading.Event()
+        self.response = []
+        self.checked_recent = False
+        self.error = None
+
+    """
+    GmailPollWaiter: is_from_users - checks the sender filter of the waiter against a message
+
+    params:
+        message_content: Dictionary - parsed message content from Gmail
+
+    returns:
+        Bool: True if the waiter has no sender filter or the message From contains one of its users
+    """
+    def is_from_users(self, message_content):
+        sender = message_content.get("From")
+        if len(self.users) == 0 or sender is None:
+            return True
+        return any(user in sender for user in self.users)
+
+
+class GmailPollScheduler:
+
+    """
+    GmailPollScheduler: constructor
+
+    params:
+        gmail: Gmail - authorized Gmail object used for listing and fetching
+        inbox: String - Ensure message came from a specifc inbox
+        min_interval: Number - seconds between polls right after new mail arrived
+        max_interval: Number - upper bound of seconds between polls while the inbox is idle
+        backoff_factor: Number - interval multiplier applied after every idle poll
+        jitter: Number - fraction of the interval randomly added or removed so waiters in many processes do not poll in lockstep
+        max_results: Integer - number of (most recent) emails checked when there is no usable history yet, and for newly registered waiters
+        incremental: Bool - only fetch messages added since the previous poll, using mailbox history ids
+        sync_state_path: String - file used to persist the incremental sync state so a restarted process resumes where it left off
+        batch_size: Integer - number of messages per batch request when fetching
+        max_consecutive_errors: Integer - failed polls in a row after which every waiter is released and wait_for_response raises
+
+    returns:
+    """
+    def __init__(
+        self,
+        gmail,
+        inbox = "INBOX",
+        min_interval = 2,
+        max_interval = 60,
+        backoff_factor = 2,
+        jitter = 0.1,
+        max_results = 10,
+        incremental = True,
+        sync_state_path = None,
+        batch_size = 50,
+        max_consecutive_errors = 3,
+    ):
+        self.gmail = gmail
+        self.inbox = inbox
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.max_results = max_results
+        self.incremental = incremental
+        self.sync_state_path = sync_state_path
+        self.batch_size = batch_size
+        self.max_consecutive_errors = max_consecutive_errors
+
+        self.interval = min_interval
+        self.history_id = None # kept here rather than on gmail, so polling never changes the state of the shared Gmail object
+        self.seen_message_ids = set()
+        self.pending_message_ids = []
+        self.recent_contents = deque(maxlen=max_results)
+        self.waiters = []
+        self.last_error = None
+        self.consecutive_errors = 0
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+        if incremental and sync_state_path:
+            self.history_id = self.gmail.read_sync_state(sync_state_path)
+
+    """
+    GmailPollScheduler: wait_for_response - registers a waiter and blocks until a matching email arrives or the timeout passes
+
+    params:
+        items_to_match: List - list of GmailSearchItems to search for in an email
+        users: List - Ensure message came from a specific email address
+        timeout: Number - seconds to wait. None waits until a match is found
+
+    returns:
+        List: list of objects containing pertinent response data for items passed in. Empty if the timeout passed
+    """
+    def wait_for_response(self, items_to_match, users=[], timeout=None):
+        waiter = self.register(items_to_match=items_to_match, users=users)
+        try:
+            waiter.event.wait(timeout)
+        finally:
+            self.unregister(waiter)
+        if waiter.error is not None:
+            raise Exception("Error: unable to poll email for a response: {}".format(waiter.error))
+        return waiter.response
+
+    """
+    GmailPollScheduler: register - adds a waiter to the shared poll loop and starts the loop if it is not running
+
+    params:
+        items_to_match: List - list of GmailSearchItems to search for in an email
+        users: List - Ensure message came from a specific email address
+
+    returns:
+        GmailPollWaiter: waiter whose event is set once response is filled in
+    """
+    def register(self, items_to_match, users=[]):
+        waiter = GmailPollWaiter(items_to_match=items_to_match, users=users)
+        with self.lock:
+            self.waiters.append(waiter)
+            self.interval = self.min_interval
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="GmailPollScheduler", daemon=True)
+                self.thread.start()
+            else:
+                self.wake_event.set() # check the new waiter right away instead of after an idle interval
+        return waiter
+
+    """
+    GmailPollScheduler: unregister - removes a waiter from the shared poll loop. The loop exits once no waiters are left
+
+    params:
+        waiter: GmailPollWaiter - waiter returned by register
+
+    returns:
+    """
+    def unregister(self, waiter):
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            if not self.waiters:
+                self.wake_event.set() # let the loop exit instead of sleeping out its interval
+
+    """
+    GmailPollScheduler: stop - releases every waiter with an empty response and stops the poll loop
+
+    params:
+
+    returns:
+    """
+    def stop(self):
+        with self.lock:
+            waiters = self.waiters
+            self.waiters = []
+        for waiter in waiters:
+            waiter.event.set()
+        self.wake_event.set()
+
+    """
+    GmailPollScheduler: run - poll loop. Polls once per interval while there are waiters
+
+    params:
+
+    returns:
+    """
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.waiters:
+                    self.thread = None
+                    return
+            self.wake_event.clear()
+            try:
+                had_activity = self.poll_once()
+                self.last_error = None
+                self.consecutive_errors = 0
+            except Exception as e:
+                self.last_error = e
+                self.consecutive_errors += 1
+                if self.consecutive_errors >= self.max_consecutive_errors:
+                    self.fail_waiters(e)
+                had_activity = False
+            self.wake_event.wait(self.next_interval(had_activity=had_activity))
+
+    """
+    GmailPollScheduler: fail_waiters - releases every waiter with an error, so wait_for_response raises instead of waiting out its timeout
+
+    params:
+        error: Exception - error raised by the last poll
+
+    returns:
+    """
+    def fail_waiters(self, error):
+        with self.lock:
+            waiters = self.waiters
+            self.waiters = []
+        for waiter in waiters:
+            waiter.error = error
+            waiter.event.set()
+        self.consecutive_errors = 0
+
+    """
+    GmailPollScheduler: poll_once - lists and downloads new messages once and evaluates them for every registered waiter
+
+    params:
+
+    returns:
+        Bool: True if new messages arrived since the previous poll
+    """
+    def poll_once(self):
+        with self.lock:
+            waiters = list(self.waiters)
+        if not waiters:
+            return False
+
+        listed_message_ids = self.list_new_message_ids()
+        message_ids = [message_id for message_id in dict.fromkeys(self.pending_message_ids + listed_message_ids) if message_id not in self.seen_message_ids]
+        new_contents = []
+        errors = {}
+        if message_ids:
+            # fetch once for every waiter without a sender filter, so recent_contents also holds messages for waiters
+            # that register later. Sender filters are applied per waiter below
+            message_contents, errors = self.gmail.get_message_contents_batch(message_ids=message_ids, inbox=self.inbox, users=[], batch_size=self.batch_size)
+            new_contents = [message_content for message_content in message_contents if message_content]
+
+        # failed fetches are retried next cycle. Only the latest listing is remembered, which keeps this bounded
+        self.pending_message_ids = [message_id for message_id in message_ids if message_id in errors]
+        self.seen_message_ids = set(message_id for message_id in listed_message_ids if message_id not in errors)
+
+        recent_contents = list(self.recent_contents)
+        for message_content in reversed(new_contents):
+            self.recent_contents.appendleft(message_content)
+
+        for waiter in waiters:
+            candidates = new_contents
+            if not waiter.checked_recent:
+                candidates = new_contents + recent_contents
+                waiter.checked_recent = True
+            candidates = [message_content for message_content in candidates if waiter.is_from_users(message_content)]
+            if not candidates:
+                continue
+            response = self.gmail.get_response_from_user_email(items_to_match=waiter.items_to_match, matcher=waiter.matcher, message_contents=candidates)
+            if response:
+                waiter.response = response
+                waiter.event.set()
+                self.unregister(waiter)
+
+        if self.incremental and self.sync_state_path:
+            self.gmail.write_sync_state(path=self.sync_state_path, history_id=self.history_id)
+        return len(message_ids) > 0
+
+    """
+    GmailPollScheduler: list_new_message_ids - lists the messages to check this cycle
+
+    params:
+
+    returns:
+        List: message ids added since the previous poll when incremental, otherwise the newest max_results message ids
+    """
+    def list_new_message_ids(self):
+        label_ids = [self.inbox] if self.inbox else None
+        if not self.incremental:
+            return list(self.gmail.list_message_ids(max_results=self.max_results, label_ids=label_ids))
+
+        if self.history_id:
+            message_ids, history_id = self.gmail.list_message_ids_added_since(history_id=self.history_id, label_id=self.inbox)
+            if message_ids is not None:
+                self.history_id = history_id
+                return message_ids
+
+        # record the history id before listing so nothing that arrives in between is missed
+        history_id = self.gmail.get_mailbox_history_id()
+        message_ids = list(self.gmail.list_message_ids(max_results=self.max_results, label_ids=label_ids))
+        self.history_id = history_id
+        return message_ids
+
+    """
+    GmailPollScheduler: next_interval - adapts the poll interval to inbox activity and applies jitter
+
+    params:
+        had_activity: Bool - True if the last poll found new messages
+
+    returns:
+        Number: seconds to wait before the next poll
+    """
+    def next_interval(self, had_activity):
+        if had_activity:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff_factor)
+        return max(0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
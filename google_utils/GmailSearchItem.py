@@ -7,8 +7,15 @@ GmailSearchItem: Item class used when searching for a specific email.
         - uuid - Checks that unique identifier in email
         - bool - Matches keyphrase and flips bit based on email
 
+    Current string delimiters:
+        - double_quote - value between double quotes after the keyphrase. Example: test="value"
+        - single_quote - value between single quotes after the keyphrase. Example: test='value'
+        - equals - value after '=' up to the end of the line. Example: test=value
+        - colon - value after ':' up to the end of the line. Example: test: value
+
 Example usage:
     item = GmailSearchItem(name="Test", type=1, phrase="test=", default="default value", optional=False)
+    item = GmailSearchItem(name="Test", type=1, phrase="test=", default="default value", optional=False, delimiter="equals")
     
     item.get_allowed_types()
     
@@ -20,10 +27,17 @@ ALLOWED_TYPES = {
     3: "bool"
 }
 
+ALLOWED_DELIMITERS = ["double_quote", "single_quote", "equals", "colon"]
+
+TYPE_IDS = {type_name: type_id for type_id, type_name in ALLOWED_TYPES.items()}
+
 class GmailSearchItem:
 
+    __slots__ = ("name", "type", "phrase", "default", "optional", "delimiter")
+
     """
-    GmailSearchItem: constructor - initializes class with pertinent information for searching a message from Gmail
+    GmailSearchItem: constructor - initializes class with pertinent information for searching a message from Gmail.
+    Items are immutable and hashable, so a list of items can be used as a cache key for its compiled matcher
 
     params:
         name: String - Name of the item
@@ -31,21 +45,25 @@ class GmailSearchItem:
         phrase: String - Keyphrase to look for in email
         default: Type Matches type parameter - default value returned if phrase not found
         optional: Bool - ensures phrase is in the email if False or the email is ignored
+        delimiter: String - how a string value is marked after the phrase. One of ALLOWED_DELIMITERS. Defaults to double_quote
 
     returns:
     """
-    def __init__(self, name, type, phrase, default, optional):
+    def __init__(self, name, type, phrase, default, optional, delimiter="double_quote"):
 
         if optional != True and optional != False:
             raise Exception("Error: parameter 'optional' was not of type bool.")
         if not ALLOWED_TYPES.get(type):
             raise Exception("Error: parameter 'type' was an unkown. Valid Types: {}".format(ALLOWED_TYPES))
+        if delimiter not in ALLOWED_DELIMITERS:
+            raise Exception("Error: parameter 'delimiter' was an unkown. Valid Delimiters: {}".format(ALLOWED_DELIMITERS))
 
-        self.name = name
-        self.type = ALLOWED_TYPES.get(type)
-        self.phrase = phrase
-        self.default = default
-        self.optional = optional
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "type", ALLOWED_TYPES.get(type))
+        object.__setattr__(self, "phrase", phrase)
+        object.__setattr__(self, "default", default)
+        object.__setattr__(self, "optional", optional)
+        object.__setattr__(self, "delimiter", delimiter)
     
     """
     GmailSearchItem: get_allowed_types - Returns dictionary containing all allowed types
@@ -56,4 +74,27 @@ class GmailSearchItem:
         Dictionary: - contains a mapping of integer with an allowed type
     """
     def get_allowed_types(self):
-        return ALLOWED_TYPES
\ No newline at end of file
+        return ALLOWED_TYPES
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Error: GmailSearchItem is immutable, create a new item instead of setting '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("Error: GmailSearchItem is immutable, create a new item instead of deleting '{}'".format(name))
+
+    def __eq__(self, other):
+        if not isinstance(other, GmailSearchItem):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __hash__(self):
+        # default is left out because it may be an unhashable value. Equal items still hash equally
+        return hash((self.name, self.type, self.phrase, self.optional, self.delimiter))
+
+    def __reduce__(self):
+        return (GmailSearchItem, (self.name, TYPE_IDS[self.type], self.phrase, self.default, self.optional, self.delimiter))
+
+    def __repr__(self):
+        return "GmailSearchItem(name={!r}, type={!r}, phrase={!r}, default={!r}, optional={!r}, delimiter={!r})".format(
+            self.name, self.type, self.phrase, self.default, self.optional, self.delimiter
+        )
\ No newline at end of file
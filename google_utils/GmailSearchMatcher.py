@@ -0,0 +1,197 @@
+try:
+    import ahocorasick # optional C implementation (pip install pyahocorasick)
+except ImportError:
+    ahocorasick = None
+import functools
+
+MATCHER_CACHE_SIZE = 128 # number of compiled matchers kept by GmailSearchMatcher.for_items
+
+"""
+GmailSearchMatcher: Compiled matcher for a list of GmailSearchItems. Builds an Aho-Corasick automaton
+once from every item phrase and finds the first occurrence of all of them in a single pass over a message.
+
+Uses pyahocorasick when it is installed and falls back to a pure python automaton otherwise.
+
+Example usage:
+    items = [
+        GmailSearchItem(name="Test", type=1, phrase="test=", default="default value", optional=False),
+        GmailSearchItem(name="Test2", type=3, phrase="approved", default=False, optional=True),
+    ]
+    matcher = GmailSearchMatcher(items)
+
+    # or reuse the compiled matcher for the same items across polls
+    matcher = GmailSearchMatcher.for_items(items)
+
+    phrase_positions = matcher.search("subject test=\"value\" approved")
+    matcher.is_correct_email(phrase_positions)
+
+"""
+
+class GmailSearchMatcher:
+
+    """
+    GmailSearchMatcher: constructor - compiles the phrases of the given items into one automaton
+
+    params:
+        items_to_match: List - list of GmailSearchItems to search for in an email
+
+    returns:
+    """
+    def __init__(self, items_to_match):
+        self.items_to_match = list(items_to_match)
+        self.phrases = []
+        self.required_phrases = []
+        self.has_empty_phrase = False
+
+        for item in self.items_to_match:
+            if item.phrase == "":
+                self.has_empty_phrase = True
+            elif item.phrase not in self.phrases:
+                self.phrases.append(item.phrase)
+            if not item.optional and item.phrase not in self.required_phrases:
+                self.required_phrases.append(item.phrase)
+
+        self.automaton = None
+        if ahocorasick and self.phrases:
+            self.automaton = ahocorasick.Automaton()
+            for phrase in self.phrases:
+                self.automaton.add_word(phrase, phrase)
+            self.automaton.make_automaton()
+        else:
+            self.build_automaton()
+
+    """
+    GmailSearchMatcher: for_items - returns a compiled matcher for the items, reusing the one compiled for equal items before
+
+    params:
+        items_to_match: List - list of GmailSearchItems to search for in an email
+
+    returns:
+        GmailSearchMatcher: compiled matcher for the items
+    """
+    @classmethod
+    def for_items(cls, items_to_match):
+        items_to_match = tuple(items_to_match)
+        try:
+            return compile_matcher(items_to_match)
+        except TypeError: # an item is not hashable, e.g. a mutable default value
+            return cls(items_to_match)
+
+    """
+    GmailSearchMatcher: build_automaton - builds the pure python Aho-Corasick automaton as a flattened state machine
+
+    Each state keeps a dictionary of every character that leads to a non root state, with the failure links already
+    folded in, so the scan only needs one dictionary lookup per character.
+
+    params:
+
+    returns:
+    """
+    def build_automaton(self):
+        transitions = [{}]
+        outputs = [[]]
+
+        for phrase in self.phrases:
+            state = 0
+            for character in phrase:
+                next_state = transitions[state].get(character)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions.append({})
+                    outputs.append([])
+                    transitions[state][character] = next_state
+                state = next_state
+            outputs[state].append(phrase)
+
+        # breadth first so every failure target is complete before it is merged into a deeper state
+        fail = [0] * len(transitions)
+        queue = list(transitions[0].values())
+        goto = [dict(state_transitions) for state_transitions in transitions]
+        index = 0
+        while index < len(queue):
+            state = queue[index]
+            index += 1
+            for character, next_state in transitions[state].items():
+                queue.append(next_state)
+                if state == 0:
+                    continue
+                fail_state = fail[state]
+                while fail_state and character not in transitions[fail_state]:
+                    fail_state = fail[fail_state]
+                fail[next_state] = transitions[fail_state].get(character, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+            if state != 0:
+                for character, next_state in goto[fail[state]].items():
+                    goto[state].setdefault(character, next_state)
+
+        self.goto = goto
+        self.outputs = outputs
+
+    """
+    GmailSearchMatcher: search - finds the first occurrence of every phrase in a single pass over the message text
+
+    params:
+        message_text: String - email header and body text
+
+    returns:
+        Dictionary: phrase mapped to the index of its first occurrence. Phrases that do not occur are left out
+    """
+    def search(self, message_text):
+        phrase_positions = {}
+        if self.has_empty_phrase:
+            phrase_positions[""] = 0
+        if not self.phrases:
+            return phrase_positions
+
+        remaining = len(self.phrases)
+        if self.automaton is not None:
+            for end, phrase in self.automaton.iter(message_text):
+                if phrase not in phrase_positions:
+                    phrase_positions[phrase] = end - len(phrase) + 1
+                    remaining -= 1
+                    if not remaining:
+                        break
+            return phrase_positions
+
+        goto = self.goto
+        outputs = self.outputs
+        state = 0
+        for end, character in enumerate(message_text):
+            state = goto[state].get(character, 0)
+            if outputs[state]:
+                for phrase in outputs[state]:
+                    if phrase not in phrase_positions:
+                        phrase_positions[phrase] = end - len(phrase) + 1
+                        remaining -= 1
+                if not remaining:
+                    break
+        return phrase_positions
+
+    """
+    GmailSearchMatcher: is_correct_email - checks the result of search contains all non-optional phrases
+
+    params:
+        phrase_positions: Dictionary - result of search for a message
+
+    returns:
+        Bool: True if every non-optional phrase was found
+    """
+    def is_correct_email(self, phrase_positions):
+        for phrase in self.required_phrases:
+            if phrase not in phrase_positions:
+                return False
+        return True
+
+
+"""
+GmailSearchMatcher: compile_matcher - cached constructor used by GmailSearchMatcher.for_items
+
+params:
+    items_to_match: Tuple - tuple of GmailSearchItems to search for in an email
+
+returns:
+    GmailSearchMatcher: compiled matcher for the items
+"""
+@functools.lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def compile_matcher(items_to_match):
+    return GmailSearchMatcher(items_to_match)
@@ -0,0 +1,70 @@
+from collections.abc import Mapping
+
+RESULT_KEYS = ("name", "type", "from", "message_id", "response")
+
+"""
+GmailSearchResult: Compact record for one GmailSearchItem matched against one message. References the message and the
+item instead of copying their fields, so results for many items of the same message share the From and message id.
+Behaves like the dictionary Gmail used to return, keyed by "name", "type", "from", "message_id" and "response".
+It is a Mapping, not a dict, so call to_dict() where a real dict is needed, e.g. for json.dumps or isinstance checks.
+
+Example usage:
+    result = GmailSearchResult(message=message, item=item, response="value")
+
+    result.response
+    result["from"]
+    json.dumps(result.to_dict())
+
+"""
+
+class GmailSearchResult(Mapping):
+
+    __slots__ = ("message", "item", "response")
+
+    """
+    GmailSearchResult: constructor
+
+    params:
+        message: GmailMessage - message the item was matched against
+        item: GmailSearchItem - item that was matched
+        response: varied based on item type - value pulled from the message for the item
+
+    returns:
+    """
+    def __init__(self, message, item, response):
+        self.message = message
+        self.item = item
+        self.response = response
+
+    """
+    GmailSearchResult: to_dict - returns the result in the dictionary format, e.g. for json serialization
+
+    params:
+
+    returns:
+        Dictionary: object keyed by "name", "type", "from", "message_id" and "response"
+    """
+    def to_dict(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if key == "name":
+            return self.item.name
+        if key == "type":
+            return self.item.type
+        if key == "from":
+            return self.message.get("From")
+        if key == "message_id":
+            return self.message.get("Message-ID")
+        if key == "response":
+            return self.response
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(RESULT_KEYS)
+
+    def __len__(self):
+        return len(RESULT_KEYS)
+
+    def __repr__(self):
+        return "GmailSearchResult({})".format(self.to_dict())
@@ -1,8 +1,12 @@
 import sys
-import io
 import httplib2
 import os
+import json
+import time
+import random
 from mimetypes import MimeTypes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from apiclient.discovery import build
 from oauth2client.file import Storage
 from oauth2client.client import AccessTokenRefreshError, flow_from_clientsecrets
@@ -19,6 +23,26 @@ except ImportError:
     print('sudo pip install --upgrade google-api-python-client')
     sys.exit(1)
 
+from HttpPool import HttpPool
+from DriveFileIndex import DriveFileIndex
+from FileHashCache import FileHashCache, md5_file
+from GoogleRequests import GoogleClient, execute_batch
+
+DRIVE_PAGE_SIZE = 1000 # largest pageSize accepted by files().list
+DRIVE_FILE_FIELDS = "id, name, mimeType, parents, md5Checksum, size, modifiedTime, trashed" # fields kept for every file in the local index
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024 # bytes per download request. Only one chunk is in memory at a time
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+DRIVE_BATCH_SIZE = 100 # most calls accepted in a single Google batch request
+SIMPLE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024 # files up to this size are uploaded in one multipart request instead of a resumable session
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_WALK_WORKERS = 8
+DEFAULT_PARENTS_PER_QUERY = 10 # folders listed by one files().list query in walk_folder. Keeps the query string short
+PARTIAL_DOWNLOAD_SUFFIX = ".part" # suffix of an unfinished download. Resumed from its size by the next download
+PARTIAL_DOWNLOAD_STATE_SUFFIX = ".part.json" # suffix of the version of the file an unfinished download belongs to
+PARTIAL_DOWNLOAD_STATE_FIELDS = ["id", "md5Checksum", "modifiedTime", "size"] # a partial download is only resumed if these are unchanged
+INVALID_PAGE_TOKEN_STATUS_CODES = [400, 404, 410] # changes().list rejects an expired or unknown start page token
+DEFAULT_RETRIES = 5 # times a rate limited or failed sub-request of a bulk operation is sent again
+
 """
 GoogleDrive: Class for interacting with a google drive account programmatically 
 
@@ -27,7 +51,8 @@ Example usage:
     google_drive = GoogleDrive()
 
     google_drive.upload("./example.mp4")
-    file_ids = google_drive.get_file_ids("example.mp4")
+    file_ids = google_drive.get_file_ids("example.mp4") # first call lists the whole drive, later lookups use the local index
+    child_ids = google_drive.get_child_file_ids("FOLDER_ID")
     for file_id in file_ids:
         google_drive.share(file_id, "email@gmail.com")
 
@@ -35,7 +60,13 @@ Example usage:
     google_drive.pull_and_set_drive_files()
     print(google_drive.drive_files)
 
+    # keep the listing in a state file and only apply changes since the last sync
+    google_drive = GoogleDrive(sync_state_path="./drive_state.json")
+    google_drive.refresh_drive_files()
+
     google_drive.create_folder("Test folder")
+    report = google_drive.mirror_folder("./local_folder", max_workers=8) # uploads files in parallel and reports throughput
+    report = google_drive.mirror_folder("./local_folder", sync=True) # later runs only upload new and changed files
     file_id = google_driver.get_file_ids("Test folder")
     print(google_drive.drive_files)
     google_drive.delete(file_id)
@@ -48,7 +79,7 @@ Make the program that is using it set the application name and secrets
 file path and call auth explicitly.
 """
 
-class GoogleDrive:
+class GoogleDrive(GoogleClient):
 
     """
     GoogleDrive(): constructor
@@ -60,7 +91,9 @@ class GoogleDrive:
         scopes: String - google developer scope. Example: 'https://www.googleapis.com/auth/drive'
         client_secret_file_path: String - path to google creds json from google developer account
         application_name: String - google developer application name
-        drive_files: List - used by multiple functions in the class to have a local list of google drive files
+        drive_files: List - used by multiple functions in the class to have a local list of google drive files. Kept in a DriveFileIndex
+        sync_state_path: String - file used to persist the listing and changes cursor, so a restarted process does not list the whole drive again
+        hash_cache_path: String - file used to persist local file hashes for sync uploads, so unchanged files are not hashed again
 
     """
     def __init__(
@@ -68,16 +101,28 @@ class GoogleDrive:
         scopes = 'https://www.googleapis.com/auth/drive',
         client_secret_file_path = './client_secrets.json',
         application_name = '',
-        drive_files = []
+        drive_files = [],
+        sync_state_path = None,
+        hash_cache_path = None
     ):
         self.scopes = scopes
         self.client_secret_file_path = client_secret_file_path
         self.application_name = application_name
+        self.file_index = DriveFileIndex()
+        self.synced = False
         self.drive_files = drive_files
+        self.start_page_token = None
+        self.sync_state_path = sync_state_path
+        if sync_state_path:
+            self.load_sync_state(sync_state_path)
+        self.hash_cache = FileHashCache(hash_cache_path)
+        self.root_folder_id = None
 
         credentials = self.get_credentials()
         http = credentials.authorize(httplib2.Http())
         self.service = discovery.build('drive', 'v3', http=http)
+        self.credentials = credentials
+        self.http_pool = HttpPool(credentials)
 
     """
     GoogleDrive(): get_credentials - checks if credentials already exist, if not save them to credential
@@ -103,52 +148,323 @@ class GoogleDrive:
             print('Storing credentials to ' + credential_path)
         return credentials
 
+    """
+    GoogleDrive(): drive_files - local list of google drive files, read from the file index
+
+    params:
+
+    returns:
+        List: file resources
+    """
+    @property
+    def drive_files(self):
+        return self.file_index.files()
+
+    @drive_files.setter
+    def drive_files(self, drive_files):
+        self.file_index = DriveFileIndex(drive_files)
+
     """
     GoogleDrive(): upload - uploads a file to google drive
 
     params:
         file_path: String - full file path to the file that will be uploaded
         folder_id: String - Google Drive ID for the folder that you want to upload the file. Defaults to None
+        resumable: Bool - use a resumable upload session. Defaults to resumable only for files larger than SIMPLE_UPLOAD_MAX_SIZE
+        sync: Bool - skip the upload if an identical file is already in the folder, and update a changed one in place instead of creating a duplicate. See sync_file
     
     returns:
         file id: String - the id of the uploaded file from Google Drive
     """
-    def upload(self, file_path, folder_id=None):
+    def upload(self, file_path, folder_id=None, resumable=None, sync=False):
+        try:
+            if sync:
+                file, action = self.sync_file(file_path, folder_id=folder_id, resumable=resumable)
+                self.hash_cache.save()
+            else:
+                file = self.create_file(file_path, folder_id=folder_id, resumable=resumable)
+        except Exception:
+            print('File could not be uploaded to google drive. Could be corrupted.')
+            return None
+        print(file.get('id'))
+        return file.get('id')
+
+
+    """
+    GoogleDrive(): create_file - uploads a file to google drive and adds it to the file index
+
+    params:
+        file_path: String - full file path to the file that will be uploaded
+        folder_id: String - Google Drive ID for the folder that you want to upload the file. Defaults to None
+        resumable: Bool - use a resumable upload session. Defaults to resumable only for files larger than SIMPLE_UPLOAD_MAX_SIZE,
+            since small files upload faster as a single multipart request
+
+    returns:
+        Dictionary: file resource with DRIVE_FILE_FIELDS
+    """
+    def create_file(self, file_path, folder_id=None, resumable=None):
         mime = MimeTypes()
         file_metadata = { 'name': os.path.basename(file_path) }
 
         if folder_id:
             file_metadata['parents'] = [folder_id]
+        if resumable is None:
+            resumable = os.path.getsize(file_path) > SIMPLE_UPLOAD_MAX_SIZE
 
         media = MediaFileUpload(
             file_path,
             mimetype=mime.guess_type(os.path.basename(file_path))[0],
-            resumable=True
+            resumable=resumable
         )
         try:
             file = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
-                fields='id'
-            ).execute()
-        except HttpError:
-            print('File could not be uploaded to google drive. Could be corrupted.')
-            pass
-        print(file.get('id'))
-        return file.get('id')
+                fields=DRIVE_FILE_FIELDS
+            ).execute(http=self.get_thread_http())
+        except Exception as e:
+            raise Exception("Error: unable to upload {} through google API call: {}".format(file_path, e)) from e
+        self.file_index.add(file)
+        return file
 
         
     """
-    GoogleDrive(): pull_and_set_drive_files - grabs files from authed google drive account and saves them on a class variable: drive_files
+    GoogleDrive(): sync_file - uploads a file only if it differs from the file with the same name in the folder.
+    Size and MD5 are compared against the md5Checksum in the file index. Local hashes come from hash_cache, so unchanged
+    files are not read again. A changed file is updated in place with files().update
 
     params:
-    
+        file_path: String - full file path to the file that will be uploaded
+        folder_id: String - Google Drive ID of the folder to sync the file into. Defaults to the drive root
+        resumable: Bool - use a resumable upload session. Defaults to resumable only for files larger than SIMPLE_UPLOAD_MAX_SIZE
+
+    returns:
+        Tuple: (Dictionary file resource, String action - "skipped", "updated" or "created")
+    """
+    def sync_file(self, file_path, folder_id=None, resumable=None):
+        if not self.synced:
+            self.refresh_drive_files()
+        existing = self.find_child(folder_id or self.get_root_folder_id(), os.path.basename(file_path))
+        if existing is None:
+            return self.create_file(file_path, folder_id=folder_id, resumable=resumable), "created"
+
+        size = os.path.getsize(file_path)
+        if existing.get('size') is not None and int(existing['size']) == size and existing.get('md5Checksum') == self.hash_cache.md5(file_path):
+            return existing, "skipped"
+
+        if resumable is None:
+            resumable = size > SIMPLE_UPLOAD_MAX_SIZE
+        media = MediaFileUpload(
+            file_path,
+            mimetype=MimeTypes().guess_type(os.path.basename(file_path))[0],
+            resumable=resumable
+        )
+        try:
+            file = self.service.files().update(
+                fileId=existing['id'],
+                media_body=media,
+                fields=DRIVE_FILE_FIELDS
+            ).execute(http=self.get_thread_http())
+        except Exception as e:
+            raise Exception("Error: unable to update {} through google API call: {}".format(file_path, e)) from e
+        self.file_index.add(file)
+        return file, "updated"
+
+
+    """
+    GoogleDrive(): find_child - finds a file or folder by name directly inside a folder in the file index. Trashed files are ignored
+
+    params:
+        folder_id: String - Google Drive ID of the parent folder
+        name: String - name of the file or folder
+        is_folder: Bool - only match folders when True, only match files when False
+
     returns:
+        Dictionary: file resource, or None if there is no match
+    """
+    def find_child(self, folder_id, name, is_folder=False):
+        for file_id in self.file_index.get_ids_by_name(name):
+            file = self.file_index.get(file_id)
+            if file is None or file.get('trashed') or folder_id not in (file.get('parents') or []):
+                continue
+            if (file.get('mimeType') == FOLDER_MIME_TYPE) == is_folder:
+                return file
+        return None
+
 
     """
-    def pull_and_set_drive_files(self):
-        results = self.service.files().list(fields="nextPageToken, files(id, name, mimeType)").execute()
-        self.drive_files = results.get('files', [])
+    GoogleDrive(): get_root_folder_id - returns the id of the drive root folder, which files without a folder_id are created in
+
+    params:
+
+    returns:
+        String: Google Drive ID of the root folder
+    """
+    def get_root_folder_id(self):
+        if self.root_folder_id is None:
+            try:
+                self.root_folder_id = self.service.files().get(fileId='root', fields='id').execute(http=self.get_thread_http()).get('id')
+            except Exception as e:
+                raise Exception("Error: unable to get root folder through google API call: {}".format(e))
+        return self.root_folder_id
+
+        
+    """
+    GoogleDrive(): list_drive_file_pages - lazily lists files from authed google drive account one page at a time, following nextPageToken
+
+    params:
+        q: String - Drive search query to filter files server side. Example: "trashed = false"
+        page_size: Integer - number of files requested per page. Capped at DRIVE_PAGE_SIZE
+
+    returns:
+        Generator: yields a List of file resources with DRIVE_FILE_FIELDS per page
+    """
+    def list_drive_file_pages(self, q=None, page_size=DRIVE_PAGE_SIZE):
+        params = {
+            'pageSize': max(1, min(page_size, DRIVE_PAGE_SIZE)),
+            'fields': "nextPageToken, files({})".format(DRIVE_FILE_FIELDS),
+        }
+        if q:
+            params['q'] = q
+
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+            try:
+                results = self.service.files().list(**params).execute(http=self.get_thread_http())
+            except Exception as e:
+                raise Exception("Error: unable to list files through google API call: {}".format(e))
+            yield results.get('files', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+
+    """
+    GoogleDrive(): pull_and_set_drive_files - grabs every file from authed google drive account and saves them on a class variable: drive_files.
+    Also rebuilds the file index used by get_file_ids and get_child_file_ids
+
+    params:
+        q: String - Drive search query to filter files server side. Defaults to every file
+        page_size: Integer - number of files requested per page
+
+    returns:
+
+    """
+    def pull_and_set_drive_files(self, q=None, page_size=DRIVE_PAGE_SIZE):
+        # take the changes cursor before listing so nothing that changes in between is missed. Filtered listings cannot be kept in sync with it
+        start_page_token = self.get_start_page_token() if q is None else None
+        file_index = DriveFileIndex()
+        for files in self.list_drive_file_pages(q=q, page_size=page_size):
+            for file in files:
+                file_index.add(file)
+        self.file_index = file_index
+        self.start_page_token = start_page_token
+        self.synced = True
+        if self.sync_state_path and start_page_token:
+            self.save_sync_state(self.sync_state_path)
+
+
+    """
+    GoogleDrive(): get_start_page_token - returns the changes cursor for the current state of the drive
+
+    params:
+
+    returns:
+        String: start page token for changes().list
+    """
+    def get_start_page_token(self):
+        try:
+            return self.service.changes().getStartPageToken().execute(http=self.get_thread_http()).get('startPageToken')
+        except Exception as e:
+            raise Exception("Error: unable to get start page token through google API call: {}".format(e))
+
+
+    """
+    GoogleDrive(): refresh_drive_files - brings drive_files up to date by applying only the changes since the last sync.
+    Lists the whole drive when there is no changes cursor yet or the cursor is no longer valid
+
+    params:
+        page_size: Integer - number of changes requested per page
+
+    returns:
+        Integer: number of changes applied, or None if the whole drive was listed
+    """
+    def refresh_drive_files(self, page_size=DRIVE_PAGE_SIZE):
+        if not self.start_page_token:
+            self.pull_and_set_drive_files(page_size=page_size)
+            return None
+
+        applied = 0
+        page_token = self.start_page_token
+        while page_token:
+            try:
+                results = self.service.changes().list(
+                    pageToken=page_token,
+                    pageSize=max(1, min(page_size, DRIVE_PAGE_SIZE)),
+                    spaces='drive',
+                    fields="nextPageToken, newStartPageToken, changes(fileId, removed, file({}))".format(DRIVE_FILE_FIELDS),
+                ).execute(http=self.get_thread_http())
+            except HttpError as e:
+                if e.resp.status in INVALID_PAGE_TOKEN_STATUS_CODES:
+                    self.pull_and_set_drive_files(page_size=page_size)
+                    return None
+                raise Exception("Error: unable to list changes through google API call: {}".format(e))
+            except Exception as e:
+                raise Exception("Error: unable to list changes through google API call: {}".format(e))
+
+            for change in results.get('changes', []):
+                if change.get('removed') or not change.get('file'):
+                    self.file_index.remove(change.get('fileId'))
+                else:
+                    self.file_index.add(change['file'])
+                applied += 1
+            # the cursor only moves once every page has been applied
+            if results.get('newStartPageToken'):
+                self.start_page_token = results.get('newStartPageToken')
+            page_token = results.get('nextPageToken')
+
+        self.synced = True
+        if self.sync_state_path:
+            self.save_sync_state(self.sync_state_path)
+        return applied
+
+
+    """
+    GoogleDrive(): save_sync_state - writes the listing and changes cursor to a json file so a later run can continue with refresh_drive_files
+
+    params:
+        path: String - path of the state file
+
+    returns:
+    """
+    def save_sync_state(self, path):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump({"start_page_token": self.start_page_token, "files": self.file_index.files()}, f)
+        os.replace(temporary_path, path)
+
+
+    """
+    GoogleDrive(): load_sync_state - restores the listing and changes cursor written by save_sync_state
+
+    params:
+        path: String - path of the state file
+
+    returns:
+        Bool: True if state was loaded, False if the file does not exist
+    """
+    def load_sync_state(self, path):
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            state = json.load(f)
+        self.file_index = DriveFileIndex(state.get("files", []))
+        self.start_page_token = state.get("start_page_token")
+        # a saved listing can be days old, so the first lookup still applies the changes since it was saved
+        self.synced = False
+        return True
 
 
     """
@@ -156,30 +472,111 @@ class GoogleDrive:
 
     params:
         file_name: String - name of the file on Google Drive
+        refresh: Bool - apply the changes since the last sync before the lookup. The drive is always synced on the first lookup
     
     returns:
         List: - with file id(s) because there can be multiple instances of a file with the same name
     """
-    def get_file_ids(self, file_name):
-        self.pull_and_set_drive_files()
-        file_ids = []
-        for item in self.drive_files:
-                if file_name == item['name']:
-                    file_ids.append(item['id'])
-        return file_ids
+    def get_file_ids(self, file_name, refresh=False):
+        if refresh or not self.synced:
+            self.refresh_drive_files()
+        return self.file_index.get_ids_by_name(file_name)
+
+
+    """
+    GoogleDrive(): get_child_file_ids - returns the id(s) of the files directly inside a folder from the local file index
+
+    params:
+        folder_id: String - folder id in google drive that will be checked for its contents
+        refresh: Bool - apply the changes since the last sync before the lookup. The drive is always synced on the first lookup
+
+    returns:
+        List: - file id(s) in the given folder
+    """
+    def get_child_file_ids(self, folder_id, refresh=False):
+        if refresh or not self.synced:
+            self.refresh_drive_files()
+        return self.file_index.get_child_ids(folder_id)
 
 
     """
     GoogleDrive(): delete - remove file with specific id from Google Drive
 
     params:
-        file_id: String - ID of the file that will be deleted from Google Drive
+        file_id: String - ID of the file that will be deleted from Google Drive. The file index is updated without listing the drive again
     
     returns:
     """
     def delete(self, file_id):
-        self.service.files().delete(fileId=file_id).execute()
-        self.pull_and_set_drive_files() # update list after deletion
+        result = self.delete_bulk([file_id])[file_id]
+        if not result["success"]:
+            raise Exception(result["error"])
+
+
+    """
+    GoogleDrive(): delete_bulk - deletes or trashes many files with batch requests. Removals are applied to the file index,
+    including the contents of deleted folders, instead of listing the drive again. Failures with a rate limit or server
+    error are sent again with exponential backoff
+
+    params:
+        file_ids: List - IDs of the files that will be deleted from Google Drive
+        trash: Bool - move the files to the trash instead of deleting them permanently
+        batch_size: Integer - number of files per batch request. Capped at DRIVE_BATCH_SIZE
+        max_retries: Integer - number of times a retriable failure is sent again
+
+    returns:
+        Dictionary: file id mapped to {"success": Bool, "error": String or None}
+    """
+    def delete_bulk(self, file_ids, trash=False, batch_size=DRIVE_BATCH_SIZE, max_retries=DEFAULT_RETRIES):
+        report = {}
+        pending = list(dict.fromkeys(file_ids))
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                time.sleep(2 ** attempt + random.random())
+
+            if trash:
+                requests = [self.service.files().update(fileId=file_id, body={'trashed': True}, fields=DRIVE_FILE_FIELDS) for file_id in pending]
+            else:
+                requests = [self.service.files().delete(fileId=file_id) for file_id in pending]
+            responses, errors = self.execute_batch(requests, batch_size=batch_size)
+
+            retry = []
+            for index, file_id in enumerate(pending):
+                error = errors.get(index)
+                report[file_id] = {"success": error is None, "error": str(error) if error is not None else None}
+                if error is None or (isinstance(error, HttpError) and error.resp.status == 404):
+                    self.remove_from_index(file_id, trash=trash and error is None)
+                elif self.is_retriable_error(error):
+                    retry.append(file_id)
+            pending = retry
+
+        if self.sync_state_path and self.start_page_token:
+            self.save_sync_state(self.sync_state_path)
+        return report
+
+
+    """
+    GoogleDrive(): remove_from_index - applies a delete or trash of a file to the file index, including everything inside it when it is a folder
+
+    params:
+        file_id: String - ID of the file that was deleted or trashed
+        trash: Bool - mark the files as trashed instead of removing them
+
+    returns:
+    """
+    def remove_from_index(self, file_id, trash=False):
+        file_ids = [file_id]
+        while file_ids:
+            file_id = file_ids.pop()
+            file_ids.extend(self.file_index.get_child_ids(file_id))
+            if not trash:
+                self.file_index.remove(file_id)
+            elif file_id in self.file_index:
+                file = dict(self.file_index.get(file_id))
+                file['trashed'] = True
+                self.file_index.add(file)
 
     
     """
@@ -187,54 +584,170 @@ class GoogleDrive:
 
     params:
         folder_id: String - folder id in google drive that will be checked for its contents
+        recursive: Bool - also return the contents of every subfolder. See walk_folder
     
     returns:
         List: - returns a list of the file id(s) in a given folder
     """
-    def get_folder_contents_by_id(self, folder_id):
-        folder_contents = []
-        page_token = None
-        while True:
-            try:
-                param = {}
-                if page_token:
-                    param['pageToken'] = page_token
-                children = self.service.children().list(
-                    folderId=folder_id, **param).execute()
-
-                for child in children.get('items', []):
-                    folder_contents.append(child['id'])
-                page_token = children.get('nextPageToken')
-                if not page_token:
-                    break
-            except:
-                print ('An error occurred')
-                break
-        return folder_contents
+    def get_folder_contents_by_id(self, folder_id, recursive=False):
+        return [file['id'] for file in self.walk_folder(folder_id, recursive=recursive)]
+
+
+    """
+    GoogleDrive(): walk_folder - lazily lists the contents of a folder, and of all its subfolders when recursive, with files().list.
+    Subfolders are expanded concurrently and several of them are listed with a single "in parents" query. Only the pages
+    in flight, the queue of folders still to expand and the ids already yielded are held in memory
+
+    params:
+        folder_id: String - folder id in google drive that will be walked
+        recursive: Bool - also walk every subfolder
+        max_workers: Integer - maximum number of list requests in flight
+        parents_per_query: Integer - number of folders listed by one query
+        page_size: Integer - number of files requested per page. Capped at DRIVE_PAGE_SIZE
+        include_trashed: Bool - also return trashed files
+
+    returns:
+        Generator: yields file resources with DRIVE_FILE_FIELDS, in no particular order. A file with several parents in the walked tree is yielded once
+    """
+    def walk_folder(self, folder_id, recursive=True, max_workers=DEFAULT_WALK_WORKERS, parents_per_query=DEFAULT_PARENTS_PER_QUERY, page_size=DRIVE_PAGE_SIZE, include_trashed=False):
+        parents_per_query = max(1, parents_per_query)
+        max_workers = max(1, max_workers)
+        pending_parent_ids = deque([folder_id])
+        seen = set([folder_id]) # a file can have several parents, so only yield it and expand it once
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while pending_parent_ids or futures:
+                while pending_parent_ids and len(futures) < max_workers:
+                    parent_ids = [pending_parent_ids.popleft() for _ in range(min(parents_per_query, len(pending_parent_ids)))]
+                    futures[executor.submit(self.list_folder_page, parent_ids, None, page_size, include_trashed)] = parent_ids
+
+                done, not_done = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent_ids = futures.pop(future)
+                    files, page_token = future.result()
+                    if page_token:
+                        futures[executor.submit(self.list_folder_page, parent_ids, page_token, page_size, include_trashed)] = parent_ids
+                    for file in files:
+                        if file['id'] in seen:
+                            continue
+                        seen.add(file['id'])
+                        if recursive and file.get('mimeType') == FOLDER_MIME_TYPE:
+                            pending_parent_ids.append(file['id'])
+                        yield file
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+    """
+    GoogleDrive(): list_folder_page - lists one page of the files directly inside one or more folders
+
+    params:
+        parent_ids: List - folder ids in google drive
+        page_token: String - nextPageToken of the previous page. Defaults to the first page
+        page_size: Integer - number of files requested per page. Capped at DRIVE_PAGE_SIZE
+        include_trashed: Bool - also return trashed files
+
+    returns:
+        Tuple: (List of file resources with DRIVE_FILE_FIELDS, String nextPageToken or None on the last page)
+    """
+    def list_folder_page(self, parent_ids, page_token=None, page_size=DRIVE_PAGE_SIZE, include_trashed=False):
+        q = "({})".format(" or ".join("'{}' in parents".format(parent_id) for parent_id in parent_ids))
+        if not include_trashed:
+            q += " and trashed = false"
+        params = {
+            'q': q,
+            'pageSize': max(1, min(page_size, DRIVE_PAGE_SIZE)),
+            'fields': "nextPageToken, files({})".format(DRIVE_FILE_FIELDS),
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        try:
+            results = self.service.files().list(**params).execute(http=self.get_thread_http())
+        except Exception as e:
+            raise Exception("Error: unable to list folder contents through google API call: {}".format(e))
+        return results.get('files', []), results.get('nextPageToken')
     
 
     """
-    GoogleDrive(): download - downloads a file to the current or specified directory
+    GoogleDrive(): download - downloads a file to the current or specified directory. Chunks are streamed straight into
+    a ".part" file next to the destination, which is renamed once the download completes and matches the md5Checksum
+    of the file. When a ".part" file is left over from an interrupted download of the same version of the file, the
+    download resumes from its size with an HTTP Range request. A partial download of an older version is started over
 
     params:
         file_id: String - ID of the file that will be downloaded from Google Drive
         path: String - path to directory where the download will go
+        chunk_size: Integer - bytes requested per chunk
+        progress_callback: Function - called after every chunk with (bytes downloaded, total bytes or None)
     
     returns:
-
+        String: path of the downloaded file
     """
-    def download(self, file_id, path = os.getcwd()):
+    def download(self, file_id, path = os.getcwd(), chunk_size=DEFAULT_DOWNLOAD_CHUNK_SIZE, progress_callback=None):
+        # always fetch the current metadata, since a partial download or the index may belong to an older version
+        try:
+            file = self.service.files().get(fileId=file_id, fields=DRIVE_FILE_FIELDS).execute(http=self.get_thread_http())
+        except Exception as e:
+            raise Exception("Error: unable to get file metadata through google API call: {}".format(e))
+        self.file_index.add(file)
+
+        file_path = os.path.join(path, file['name'])
+        partial_path = file_path + PARTIAL_DOWNLOAD_SUFFIX
+        state_path = file_path + PARTIAL_DOWNLOAD_STATE_SUFFIX
+        version = {field: file.get(field) for field in PARTIAL_DOWNLOAD_STATE_FIELDS}
+        size = int(file['size']) if file.get('size') is not None else None
+
+        offset = 0
+        if os.path.exists(partial_path) and self.load_partial_download_state(state_path) == version:
+            offset = os.path.getsize(partial_path)
+            if size is not None and offset > size:
+                offset = 0
+        if not offset:
+            with open(state_path, 'w') as f:
+                json.dump(version, f)
+
         request = self.service.files().get_media(fileId=file_id)
-        name = self.service.files().get(fileId=file_id).execute()['name']
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-            print(int(status.progress() * 100))
-        f = open(path + '/' + name, 'wb')
-        f.write(fh.getvalue())
-        f.close()
+        request.http = self.get_thread_http() # MediaIoBaseDownload sends every chunk with request.http
+        with open(partial_path, 'ab' if offset else 'wb') as fh:
+            if size is None or offset < size:
+                downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size)
+                downloader._progress = offset # MediaIoBaseDownload builds the Range header from _progress
+                done = False
+                while done is False:
+                    try:
+                        status, done = downloader.next_chunk()
+                    except Exception as e:
+                        raise Exception("Error: unable to download file through google API call, {} can be resumed: {}".format(partial_path, e))
+                    if progress_callback:
+                        progress_callback(status.resumable_progress, status.total_size)
+
+        if file.get('md5Checksum') and md5_file(partial_path) != file['md5Checksum']:
+            os.remove(partial_path)
+            os.remove(state_path)
+            raise Exception("Error: downloaded file does not match the md5Checksum of {}, the partial download was removed".format(file_id))
+        os.replace(partial_path, file_path)
+        os.remove(state_path)
+        return file_path
+
+
+    """
+    GoogleDrive(): load_partial_download_state - reads the version of the file a partial download belongs to
+
+    params:
+        state_path: String - path of the state file written next to the ".part" file
+
+    returns:
+        Dictionary: id, md5Checksum, modifiedTime and size of the file when the download started, or None if it is missing or unreadable
+    """
+    def load_partial_download_state(self, state_path):
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return None
 
 
     """
@@ -242,7 +755,7 @@ class GoogleDrive:
 
     params:
         folder: String - name of the folder that will be created
-        recursive: Bool - will walk down the path starting at the root and upload the contents.
+        recursive: Bool - will walk down the path starting at the root and upload the contents. See mirror_folder
     
     returns:
         String: - Id of the folder that is now created in Google Drive
@@ -250,60 +763,242 @@ class GoogleDrive:
     def create_folder(self, folder, recursive=False):
         if recursive:
             print('recursive ON')
-            ids = {}
-            for root, sub, files in os.walk(folder):
-                par = os.path.dirname(root)
-
-                file_metadata = {
-                    'name': os.path.basename(root),
-                    'mimeType': 'application/vnd.google-apps.folder'
-                }
-                if par in ids.keys():
-                    file_metadata['parents'] = [ids[par]]
-                file = self.service.files().create(body=file_metadata, fields='id').execute()
-                id = file.get('id')
-                ids[root] = id
-                for f in files:
-                    self.upload(root + '/' + f, id)
+            return self.mirror_folder(folder)["root_id"]
         else:
             print('recursive OFF')
             file_metadata = {
                     'name': os.path.basename(folder),
-                    'mimeType': 'application/vnd.google-apps.folder'
+                    'mimeType': FOLDER_MIME_TYPE
                 }
             file = self.service.files().create(body=file_metadata,
-                                            fields='id').execute()
+                                            fields=DRIVE_FILE_FIELDS).execute(http=self.get_thread_http())
+            self.file_index.add(file)
             print(file.get('id'))
             return(file.get('id'))
 
 
+    """
+    GoogleDrive(): mirror_folder - replicates a local folder structure and its files in Google Drive.
+    Folders are created one directory level at a time with batch requests, and the files of every level are uploaded on a
+    bounded thread pool while deeper levels are still being created. Small files use simple uploads, large files resumable ones.
+    With sync, existing folders are reused and files go through sync_file, so re-running a mirror only uploads what changed.
+    Folder creates and uploads that fail with a rate limit or server error are sent again with exponential backoff
+
+    params:
+        folder: String - path of the local folder to mirror
+        parent_id: String - Google Drive ID of the folder to create the mirror in. Defaults to the drive root
+        max_workers: Integer - maximum number of concurrent uploads
+        simple_upload_max_size: Integer - largest file, in bytes, uploaded without a resumable session
+        sync: Bool - reuse existing folders and skip or update existing files instead of creating duplicates
+        max_retries: Integer - number of times a retriable folder create or upload is sent again
+
+    returns:
+        Dictionary: {
+            "root_id": String or None - Id of the mirrored root folder,
+            "folders": local folder path mapped to {"id": String or None, "success": Bool, "error": String or None, "action": "created", "existing" or None},
+            "files": local file path mapped to {"id": String or None, "success": Bool, "error": String or None, "size": Integer, "action": "created", "updated", "skipped" or None},
+            "bytes": Integer - bytes uploaded. Skipped files are not counted,
+            "seconds": Number - time taken,
+            "files_per_second": Number,
+            "bytes_per_second": Number
+        }
+    """
+    def mirror_folder(self, folder, parent_id=None, max_workers=DEFAULT_UPLOAD_WORKERS, simple_upload_max_size=SIMPLE_UPLOAD_MAX_SIZE, sync=False, max_retries=DEFAULT_RETRIES):
+        started_at = time.time()
+        if sync:
+            if not self.synced:
+                self.refresh_drive_files()
+            parent_id = parent_id or self.get_root_folder_id()
+        folder = os.path.normpath(folder)
+        levels = {}
+        local_files = {}
+        for root, sub, files in os.walk(folder):
+            depth = 0 if root == folder else os.path.relpath(root, folder).count(os.sep) + 1
+            levels.setdefault(depth, []).append(root)
+            local_files[root] = [os.path.join(root, f) for f in files]
+
+        def upload_file(upload, file_path, folder_id, resumable):
+            for attempt in range(max_retries + 1):
+                if attempt > 0:
+                    time.sleep(2 ** attempt + random.random())
+                try:
+                    return upload(file_path, folder_id, resumable)
+                except Exception as e:
+                    # create_file and sync_file chain the google API error as the cause
+                    if attempt == max_retries or not self.is_retriable_error(e.__cause__):
+                        raise
+
+        folder_ids = {os.path.dirname(folder): parent_id}
+        folder_report = {}
+        file_report = {}
+        futures = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for depth in sorted(levels):
+                roots = []
+                for root in levels[depth]:
+                    if folder_ids.get(os.path.dirname(root)) is None and depth > 0:
+                        folder_report[root] = {"id": None, "success": False, "error": "Error: parent folder was not created", "action": None}
+                        continue
+                    existing = self.find_child(folder_ids.get(os.path.dirname(root)), os.path.basename(root), is_folder=True) if sync else None
+                    if existing is not None:
+                        folder_ids[root] = existing['id']
+                        folder_report[root] = {"id": existing['id'], "success": True, "error": None, "action": "existing"}
+                    else:
+                        roots.append(root)
+
+                # only the failed creates are sent again, and the next level waits until this one is settled
+                pending = roots
+                for attempt in range(max_retries + 1):
+                    if not pending:
+                        break
+                    if attempt > 0:
+                        time.sleep(2 ** attempt + random.random())
+
+                    requests = []
+                    for root in pending:
+                        file_metadata = {
+                            'name': os.path.basename(root),
+                            'mimeType': FOLDER_MIME_TYPE
+                        }
+                        if folder_ids.get(os.path.dirname(root)):
+                            file_metadata['parents'] = [folder_ids[os.path.dirname(root)]]
+                        requests.append(self.service.files().create(body=file_metadata, fields=DRIVE_FILE_FIELDS))
+                    responses, errors = self.execute_batch(requests)
+
+                    retry = []
+                    for index, root in enumerate(pending):
+                        if index in responses:
+                            self.file_index.add(responses[index])
+                            folder_ids[root] = responses[index].get('id')
+                            folder_report[root] = {"id": folder_ids[root], "success": True, "error": None, "action": "created"}
+                        else:
+                            folder_report[root] = {"id": None, "success": False, "error": str(errors.get(index)), "action": None}
+                            if self.is_retriable_error(errors.get(index)):
+                                retry.append(root)
+                    pending = retry
+
+                for root in levels[depth]:
+                    for file_path in local_files[root]:
+                        if folder_ids.get(root) is None:
+                            file_report[file_path] = {"id": None, "success": False, "error": "Error: parent folder was not created", "size": 0, "action": None}
+                            continue
+                        size = os.path.getsize(file_path)
+                        file_report[file_path] = {"id": None, "success": False, "error": None, "size": size, "action": None}
+                        upload = self.sync_file if sync else self.create_file
+                        futures[file_path] = executor.submit(upload_file, upload, file_path, folder_ids[root], size > simple_upload_max_size)
+
+            for file_path, future in futures.items():
+                try:
+                    result = future.result()
+                    file, action = result if sync else (result, "created")
+                    file_report[file_path]["id"] = file.get('id')
+                    file_report[file_path]["success"] = True
+                    file_report[file_path]["action"] = action
+                except Exception as e:
+                    file_report[file_path]["error"] = str(e)
+
+        if sync:
+            self.hash_cache.save()
+        seconds = time.time() - started_at
+        uploaded_files = [entry for entry in file_report.values() if entry["success"] and entry["action"] != "skipped"]
+        uploaded_bytes = sum(entry["size"] for entry in uploaded_files)
+        return {
+            "root_id": folder_ids.get(folder),
+            "folders": folder_report,
+            "files": file_report,
+            "bytes": uploaded_bytes,
+            "seconds": seconds,
+            "files_per_second": len(uploaded_files) / seconds if seconds else 0,
+            "bytes_per_second": uploaded_bytes / seconds if seconds else 0,
+        }
+
+
+    """
+    GoogleDrive(): execute_batch - executes many requests as Google batch requests of up to batch_size calls with GoogleRequests.execute_batch
+
+    params:
+        requests: List - google API request objects
+        batch_size: Integer - number of requests per batch. Capped at DRIVE_BATCH_SIZE
+
+    returns:
+        Tuple: (Dictionary of request index to response, Dictionary of request index to the exception raised for it)
+    """
+    def execute_batch(self, requests, batch_size=DRIVE_BATCH_SIZE):
+        return execute_batch(self.service, requests, batch_size=batch_size, http=self.get_thread_http())
+
+
     """
     GoogleDrive(): share - shares a file or folder with a specified email
 
     params:
         file_id: String - ID of the file that will be shared from Google Drive
         email: String - email address that file will be shared with
+        role: String - permission role. Example: reader, commenter, writer
     
     returns:
+        Dictionary: {"success": Bool, "permission_id": String or None, "role": String, "error": String or None}
+    """
+    def share(self, file_id, email, role='reader'):
+        result = self.share_bulk([file_id], {email: role})[file_id][email]
+        if result["success"]:
+            print("Got response: " + str(result["permission_id"]) + ". For file: " + str(file_id))
+        else:
+            print(result["error"])
+        return result
+
 
     """
-    def share(self, file_id, email):
-        def callback(request_id, response, exception):
-            if exception:
-                # Handle error
-                print(exception)
-            else:
-                print("Got response: " + str(response.get('id')) + ". For request: " + str(request_id))
+    GoogleDrive(): share_bulk - shares many files with many recipients. Permission creates for every file and recipient
+    pair are packed into batch requests, and only the pairs that failed with a rate limit or server error are sent again
+    with exponential backoff
 
-        batch = self.service.new_batch_http_request(callback=callback)
-        user_permission = {
-            'type': 'user',
-            'role': 'reader',
-            'emailAddress': email
-        }
-        batch.add(self.service.permissions().create(
-            fileId=file_id,
-            body=user_permission,
-            fields='id',
-        ))
-        batch.execute()
\ No newline at end of file
+    params:
+        file_ids: List - IDs of the files that will be shared from Google Drive
+        recipients: List or Dictionary - email addresses shared with as role, or email address mapped to its own role
+        role: String - permission role for recipients passed as a list. Example: reader, commenter, writer
+        batch_size: Integer - number of permission creates per batch request. Capped at DRIVE_BATCH_SIZE
+        max_retries: Integer - number of times a retriable failure is sent again
+        send_notification_email: Bool - whether Google emails the recipients. Defaults to the Drive default
+
+    returns:
+        Dictionary: file id mapped to email address mapped to {"success": Bool, "permission_id": String or None, "role": String, "error": String or None}
+    """
+    def share_bulk(self, file_ids, recipients, role='reader', batch_size=DRIVE_BATCH_SIZE, max_retries=DEFAULT_RETRIES, send_notification_email=None):
+        if not isinstance(recipients, dict):
+            recipients = {email: role for email in recipients}
+
+        results = {file_id: {} for file_id in file_ids}
+        pending = [(file_id, email, recipient_role) for file_id in results for email, recipient_role in recipients.items()]
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                time.sleep(2 ** attempt + random.random())
+
+            requests = []
+            for file_id, email, recipient_role in pending:
+                params = {
+                    'fileId': file_id,
+                    'body': {
+                        'type': 'user',
+                        'role': recipient_role,
+                        'emailAddress': email
+                    },
+                    'fields': 'id',
+                }
+                if send_notification_email is not None:
+                    params['sendNotificationEmail'] = send_notification_email
+                requests.append(self.service.permissions().create(**params))
+            responses, errors = self.execute_batch(requests, batch_size=batch_size)
+
+            retry = []
+            for index, (file_id, email, recipient_role) in enumerate(pending):
+                if index in responses:
+                    results[file_id][email] = {"success": True, "permission_id": responses[index].get('id'), "role": recipient_role, "error": None}
+                else:
+                    results[file_id][email] = {"success": False, "permission_id": None, "role": recipient_role, "error": str(errors.get(index))}
+                    if self.is_retriable_error(errors.get(index)):
+                        retry.append((file_id, email, recipient_role))
+            pending = retry
+
+        return results
@@ -0,0 +1,90 @@
+from googleapiclient.errors import HttpError
+
+MAX_BATCH_SIZE = 100 # hard limit on the number of calls in a single Google batch request
+RETRIABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+RATE_LIMIT_REASONS = ['rateLimitExceeded', 'userRateLimitExceeded', 'sharingRateLimitExceeded'] # 403 reasons that mean slow down rather than forbidden
+
+"""
+GoogleRequests: Helpers for executing google API requests shared by Gmail, GoogleDrive and Youtube. GoogleClient is
+the base class of the three clients and holds what they have in common.
+
+Example usage:
+    requests = [service.users().messages().get(userId='me', id=message_id) for message_id in message_ids]
+
+    responses, errors = execute_batch(service, requests, batch_size=50, http=http_pool.get())
+
+    class Gmail(GoogleClient):
+        ...
+
+"""
+
+class GoogleClient:
+
+    """
+    GoogleClient: get_thread_http - returns an authorized http client owned by the calling thread. httplib2.Http objects are not thread safe and must not be shared between threads
+
+    params:
+
+    returns:
+        httplib2.Http: authorized http client for the current thread, from the http_pool set by the subclass
+    """
+    def get_thread_http(self):
+        return self.http_pool.get()
+
+    """
+    GoogleClient: is_retriable_error - checks if a failed request should be sent again after a backoff
+
+    params:
+        error: Exception - error raised for the request
+
+    returns:
+        Bool: True for 429 and 5xx responses and for 403 responses caused by rate limits
+    """
+    def is_retriable_error(self, error):
+        if not isinstance(error, HttpError):
+            return False
+        if error.resp.status in RETRIABLE_STATUS_CODES:
+            return True
+        if error.resp.status == 403:
+            content = error.content.decode("utf-8", "replace") if isinstance(error.content, bytes) else str(error.content)
+            return any(reason in content for reason in RATE_LIMIT_REASONS)
+        return False
+
+
+"""
+GoogleRequests: execute_batch - executes a list of google API requests through Google batch requests
+
+params:
+    service: discovery resource the requests were built from, used to create the batch requests
+    requests: List - unexecuted google API request objects
+    batch_size: Integer - number of requests per batch request. Capped at MAX_BATCH_SIZE
+    http: httplib2.Http - authorized http client owned by the calling thread
+
+returns:
+    Tuple: (Dictionary of request index to response, Dictionary of request index to the exception raised for it)
+"""
+def execute_batch(service, requests, batch_size=MAX_BATCH_SIZE, http=None):
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    responses = {}
+    errors = {}
+
+    def callback(request_id, response, exception):
+        if exception:
+            errors[int(request_id)] = exception
+        else:
+            responses[int(request_id)] = response
+
+    for start in range(0, len(requests), batch_size):
+        end = min(start + batch_size, len(requests))
+        batch = service.new_batch_http_request(callback=callback)
+        for index in range(start, end):
+            # request ids must be unique within a batch, so key by position rather than resource id
+            batch.add(requests[index], request_id=str(index))
+        try:
+            batch.execute(http=http)
+        except Exception as e:
+            for index in range(start, end):
+                if index not in responses and index not in errors:
+                    errors[index] = Exception("Error: batch request failed: {}".format(e))
+
+    return responses, errors
@@ -0,0 +1,173 @@
+import threading
+import httplib2
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_MAX_WORKERS = 8
+
+"""
+HttpPool: Pool of authorized httplib2 clients, one per thread. httplib2.Http is not thread safe, so every
+thread that executes google API requests gets its own client. Also runs functions on a long lived bounded thread
+pool, so worker threads and their clients (and open connections) are reused across calls, and reports per-call
+errors instead of aborting.
+
+Example usage:
+    http_pool = HttpPool(credentials)
+
+    request.execute(http=http_pool.get())
+
+    results, errors = http_pool.map(lambda message_id: gmail.get_message_content(message_id), message_ids, max_workers=8)
+
+    http_pool.close()
+
+"""
+
+class HttpPool:
+
+    """
+    HttpPool: constructor - initializes the pool for a set of oauth2client credentials
+
+    params:
+        credentials: oauth2client credentials used to authorize every http client
+        max_workers: Integer - number of worker threads used by map. Calls asking for more are capped at this
+
+    returns:
+    """
+    def __init__(self, credentials, max_workers=DEFAULT_MAX_WORKERS):
+        self.credentials = credentials
+        self.max_workers = max(1, max_workers)
+        self.thread_local = threading.local()
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+    """
+    HttpPool: get - returns the authorized http client owned by the calling thread, creating it on first use
+
+    params:
+
+    returns:
+        httplib2.Http: authorized http client for the current thread
+    """
+    def get(self):
+        http = getattr(self.thread_local, 'http', None)
+        if http is None:
+            http = self.credentials.authorize(httplib2.Http())
+            self.thread_local.http = http
+        return http
+
+    """
+    HttpPool: get_executor - returns the pool's ThreadPoolExecutor, creating it on first use
+
+    params:
+
+    returns:
+        ThreadPoolExecutor: executor with max_workers threads that lives until close
+    """
+    def get_executor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, initializer=self.mark_worker_thread)
+            return self.executor
+
+    """
+    HttpPool: mark_worker_thread - flags a thread as one of the pool's workers
+
+    params:
+
+    returns:
+    """
+    def mark_worker_thread(self):
+        self.thread_local.is_worker = True
+
+    """
+    HttpPool: submit - calls function in the background on the pool's ThreadPoolExecutor, e.g. to prefetch the next page
+
+    Calls made from inside a pool worker run in the calling thread instead, for the same reason as in map.
+
+    params:
+        function: Function - called with args. Should execute its requests with http=get()
+        *args - arguments for function
+
+    returns:
+        concurrent.futures.Future: future for the result of function
+    """
+    def submit(self, function, *args):
+        if not getattr(self.thread_local, 'is_worker', False):
+            return self.get_executor().submit(function, *args)
+
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    """
+    HttpPool: map - calls function for every item on the pool's bounded ThreadPoolExecutor
+
+    Calls made from inside a pool worker, e.g. a mapped function that maps again, run in the calling thread instead of
+    waiting on workers that are all busy with the outer call.
+
+    params:
+        function: Function - called with one item. Should execute its requests with http=get()
+        items: List - items to call function with
+        max_workers: Integer - maximum number of calls in flight. Capped at the pool's max_workers
+
+    returns:
+        Tuple: (List of results in the same order as items with None for failed calls, Dictionary of item index to the exception raised for it)
+    """
+    def map(self, function, items, max_workers=DEFAULT_MAX_WORKERS):
+        items = list(items)
+        results = [None] * len(items)
+        errors = {}
+        if not items:
+            return results, errors
+
+        if getattr(self.thread_local, 'is_worker', False):
+            for index, item in enumerate(items):
+                try:
+                    results[index] = function(item)
+                except Exception as e:
+                    errors[index] = e
+            return results, errors
+
+        executor = self.get_executor()
+        max_workers = max(1, min(max_workers, self.max_workers))
+        futures = {}
+        for index, item in enumerate(items):
+            if len(futures) >= max_workers:
+                self.collect(futures, wait(futures, return_when=FIRST_COMPLETED).done, results, errors)
+            futures[executor.submit(function, item)] = index
+        self.collect(futures, list(futures), results, errors)
+        return results, errors
+
+    """
+    HttpPool: collect - moves finished futures of a map call into its results and errors
+
+    params:
+        futures: Dictionary - future to item index of the calls in flight
+        done: Iterable - futures to collect, waiting for any that are not finished
+        results: List - results of the map call
+        errors: Dictionary - item index to the exception raised for it
+
+    returns:
+    """
+    def collect(self, futures, done, results, errors):
+        for future in done:
+            index = futures.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                errors[index] = e
+
+    """
+    HttpPool: close - shuts down the worker threads. A later map call starts a new executor
+
+    params:
+
+    returns:
+    """
+    def close(self):
+        with self.executor_lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+"""
+MessageCache: Bounded least recently used cache of parsed Gmail messages keyed by message id.
+Gmail message content never changes for a given id, so a cached message can be reused instead of
+being downloaded and decoded again. Optionally backed by a sqlite file so the cache survives restarts.
+
+Example usage:
+    cache = MessageCache(max_entries=5000, max_bytes=64 * 1024 * 1024, sqlite_path="./messages.sqlite")
+    gmail = Gmail(message_cache=cache)
+
+    cache.put("MESSAGE_ID", {"content": {"Message-ID": "MESSAGE_ID", "Subject": "Hello"}})
+    cache.get("MESSAGE_ID")
+
+"""
+
+class MessageCache:
+
+    """
+    MessageCache: constructor - initializes an empty in memory cache and opens the sqlite store when a path is given
+
+    params:
+        max_entries: Integer - maximum number of messages kept in memory
+        max_bytes: Integer - maximum approximate size (json encoded) of the messages kept in memory
+        sqlite_path: String - path to a sqlite file used as a persistent backing store. Defaults to None (memory only)
+
+    returns:
+    """
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, sqlite_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_path = sqlite_path
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        self.connection = None
+        if sqlite_path:
+            self.connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS messages (message_id TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+            self.connection.commit()
+
+    """
+    MessageCache: get - returns the cached entry for a message id, falling back to the sqlite store
+
+    params:
+        message_id: String - message id provided by Google API
+
+    returns:
+        Dictionary: cached entry or None if the message is not cached
+    """
+    def get(self, message_id):
+        with self.lock:
+            cached = self.entries.get(message_id)
+            if cached is not None:
+                self.entries.move_to_end(message_id)
+                return cached[0]
+
+            if self.connection is None:
+                return None
+            row = self.connection.execute("SELECT entry FROM messages WHERE message_id = ?", (message_id,)).fetchone()
+            if row is None:
+                return None
+            entry = json.loads(row[0])
+            self.remember(message_id, entry, len(row[0]))
+            return entry
+
+    """
+    MessageCache: put - adds or replaces the entry for a message id and evicts the least recently used entries past the limits
+
+    params:
+        message_id: String - message id provided by Google API
+        entry: Dictionary - json serializable entry to cache
+
+    returns:
+    """
+    def put(self, message_id, entry):
+        encoded_entry = json.dumps(entry)
+        with self.lock:
+            self.remember(message_id, entry, len(encoded_entry))
+            if self.connection is not None:
+                self.connection.execute("INSERT OR REPLACE INTO messages (message_id, entry) VALUES (?, ?)", (message_id, encoded_entry))
+                self.connection.commit()
+
+    """
+    MessageCache: remember - stores an entry in memory and enforces max_entries and max_bytes. Caller must hold the lock
+
+    params:
+        message_id: String - message id provided by Google API
+        entry: Dictionary - entry to cache
+        entry_bytes: Integer - approximate size of the entry
+
+    returns:
+    """
+    def remember(self, message_id, entry, entry_bytes):
+        previous = self.entries.pop(message_id, None)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+
+        if entry_bytes > self.max_bytes:
+            return # would evict everything else and still not fit. Only keep it on disk
+
+        self.entries[message_id] = (entry, entry_bytes)
+        self.total_bytes += entry_bytes
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            evicted_id, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted[1]
+
+    """
+    MessageCache: clear - removes every entry from memory and from the sqlite store
+
+    params:
+
+    returns:
+    """
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM messages")
+                self.connection.commit()
+
+    """
+    MessageCache: close - closes the sqlite store
+
+    params:
+
+    returns:
+    """
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, message_id):
+        return self.get(message_id) is not None
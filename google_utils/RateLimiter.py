@@ -0,0 +1,58 @@
+import time
+import threading
+
+"""
+RateLimiter: Thread safe token bucket used to stay under per second API quotas. Tokens refill continuously at
+rate per second up to capacity, and acquire blocks until enough tokens are available.
+
+Example usage:
+    rate_limiter = RateLimiter(rate=2, capacity=10)
+
+    rate_limiter.acquire()
+    request.execute()
+
+"""
+
+class RateLimiter:
+
+    """
+    RateLimiter: constructor
+
+    params:
+        rate: Number - tokens added per second
+        capacity: Number - most tokens that can be saved up for a burst. Defaults to rate
+
+    returns:
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise Exception("Error: parameter 'rate' must be greater than 0.")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    """
+    RateLimiter: acquire - blocks until tokens are available and takes them
+
+    params:
+        tokens: Number - tokens to take. Requests for more than capacity wait until the bucket is full and then go into debt
+
+    returns:
+        Number: seconds spent waiting
+    """
+    def acquire(self, tokens=1):
+        waited = 0
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                needed = min(tokens, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+                time.sleep(delay)
+                waited += delay
@@ -5,6 +5,7 @@ import httplib2
 import time
 import random
 import os
+import json
 from mimetypes import MimeTypes
 from apiclient.discovery import build
 from oauth2client.file import Storage
@@ -22,10 +23,15 @@ except ImportError:
     print('sudo pip install --upgrade google-api-python-client')
     sys.exit(1)
 
+from HttpPool import HttpPool
+from GoogleRequests import GoogleClient
+
 MAX_RETRIES = 10
 httplib2.RETRIES = 1
 
 RETRIABLE_STATUS_CODES = [500, 502, 503, 504]
+EXPIRED_SESSION_STATUS_CODES = [404, 410] # a saved resumable session is no longer known to the server
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024 # bytes per upload request. Must be a multiple of 256 KB
 VALID_PRIVACY_STATUSES = ["public", "private", "unlisted"]
 RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, IOError, http.client.NotConnected,
   http.client.IncompleteRead, http.client.ImproperConnectionState,
@@ -50,6 +56,14 @@ Example usage:
             privacyStatus = VALID_PRIVACY_STATUSES[1]
         )
     )
+
+    # upload in 8 MB chunks, resume after a crash from the state file and report progress to a callback
+    youtube.initialize_upload(
+        options = dict(file = "./test.mp4", title = "video test"),
+        chunk_size = 8 * 1024 * 1024,
+        state_path = "./test.mp4.upload.json",
+        progress_callback = lambda event: print(event)
+    )
 """
 
 """
@@ -59,7 +73,7 @@ file path and call auth explicitly.
 """
 
 
-class Youtube:
+class Youtube(GoogleClient):
 
     """
     Youtube(): constructor
@@ -86,6 +100,8 @@ class Youtube:
         credentials = self.get_credentials()
         http = credentials.authorize(httplib2.Http())
         self.service = discovery.build('youtube', 'v3', http=http)
+        self.credentials = credentials
+        self.http_pool = HttpPool(credentials)
 
 
     """
@@ -113,30 +129,60 @@ class Youtube:
         return credentials
 
     """
-    Youtube(): resumable_upload - uploads provided file in a resumable approach
+    Youtube(): resumable_upload - uploads provided file in a resumable approach, one chunk per request. Retriable errors
+    are retried from the last uploaded chunk with backoff. With state_path, the session uri and offset are saved after
+    every chunk and a saved session for the same file is resumed, so a crashed process continues mid-file
 
     params:
         insert_request: Object - created by insert Youtube API call
+        progress_callback: Function - called with a telemetry dictionary. "event" is "resumed", "progress", "retry" or "done",
+            with "bytes_uploaded", "total_bytes", "bytes_per_second" and, for retries, "retry", "error" and "sleep_seconds"
+        state_path: String - json file used to persist the resumable session. Removed once the upload is done
+        file_path: String - path of the uploaded file, used to check that saved state belongs to it
 
     returns:
         String: video id from succesful video upload
     """
-    def resumable_upload(self, insert_request):
+    def resumable_upload(self, insert_request, progress_callback=None, state_path=None, file_path=None):
+        total_bytes = insert_request.resumable.size()
+        state = self.load_upload_state(state_path, file_path) if state_path else None
+        if state:
+            # makes next_chunk ask the server how much of the saved session it already has before sending more
+            insert_request.resumable_uri = state["resumable_uri"]
+            insert_request.resumable_progress = state["resumable_progress"]
+            insert_request._in_error_state = True
+            self.report_upload(progress_callback, "resumed", bytes_uploaded=state["resumable_progress"], total_bytes=total_bytes)
+
+        started_at = time.time()
+        start_offset = insert_request.resumable_progress
         response = None
-        error = None
         retry = 0
         while response is None:
+            error = None
             try:
-                print ("Uploading file...")
-                status, response = insert_request.next_chunk()
+                status, response = insert_request.next_chunk(http=self.get_thread_http())
                 if response is not None:
                     if 'id' in response:
-                        print ("Video id '%s' was successfully uploaded." % response['id'])
+                        if state_path and os.path.exists(state_path):
+                            os.remove(state_path)
+                        self.report_upload(progress_callback, "done", bytes_uploaded=total_bytes, total_bytes=total_bytes, started_at=started_at, start_offset=start_offset, video_id=response['id'])
                         return response['id']
                     else:
-                        exit("The upload failed with an unexpected response: %s" % response)
+                        raise Exception("Error: The upload failed with an unexpected response: %s" % response)
+                retry = 0 # retries are counted per chunk
+                if state_path:
+                    self.save_upload_state(state_path, file_path, insert_request)
+                self.report_upload(progress_callback, "progress", bytes_uploaded=status.resumable_progress, total_bytes=total_bytes, started_at=started_at, start_offset=start_offset)
             except HttpError as e:
-                if e.resp.status in RETRIABLE_STATUS_CODES:
+                if state and e.resp.status in EXPIRED_SESSION_STATUS_CODES:
+                    # the saved session expired, so start a new one from the beginning of the file
+                    state = None
+                    insert_request.resumable_uri = None
+                    insert_request.resumable_progress = 0
+                    insert_request._in_error_state = False
+                    start_offset = 0
+                    error = "The saved upload session expired, restarting the upload"
+                elif e.resp.status in RETRIABLE_STATUS_CODES:
                     error = "A retriable HTTP error %d occurred:\n%s" % (e.resp.status, e.content)
                 else:
                     raise
@@ -144,15 +190,84 @@ class Youtube:
                 error = "A retriable error occurred: %s" % e
 
             if error is not None:
-                print (error)
                 retry += 1
-            if retry > MAX_RETRIES:
-                exit("No longer attempting to retry.")
+                if retry > MAX_RETRIES:
+                    raise Exception("Error: No longer attempting to retry: {}".format(error))
+
+                max_sleep = 2 ** retry
+                sleep_seconds = random.random() * max_sleep
+                self.report_upload(progress_callback, "retry", bytes_uploaded=insert_request.resumable_progress, total_bytes=total_bytes, started_at=started_at, start_offset=start_offset, retry=retry, error=error, sleep_seconds=sleep_seconds)
+                time.sleep(sleep_seconds)
+
+    """
+    Youtube(): report_upload - sends one telemetry event to the progress callback
+
+    params:
+        progress_callback: Function - called with the telemetry dictionary. Nothing is reported when None
+        event: String - "resumed", "progress", "retry" or "done"
+        bytes_uploaded: Integer - bytes the server has received
+        total_bytes: Integer - size of the file
+        started_at: Number - time the upload started, used for bytes_per_second
+        start_offset: Integer - bytes already uploaded when the upload started, left out of bytes_per_second
+        **details - extra items for the event, e.g. retry, error, sleep_seconds or video_id
 
-            max_sleep = 2 ** retry
-            sleep_seconds = random.random() * max_sleep
-            print ("Sleeping %f seconds and then retrying..." % sleep_seconds)
-            time.sleep(sleep_seconds)
+    returns:
+    """
+    def report_upload(self, progress_callback, event, bytes_uploaded, total_bytes, started_at=None, start_offset=0, **details):
+        if progress_callback is None:
+            return
+        seconds = time.time() - started_at if started_at else 0
+        telemetry = {
+            "event": event,
+            "bytes_uploaded": bytes_uploaded,
+            "total_bytes": total_bytes,
+            "bytes_per_second": (bytes_uploaded - start_offset) / seconds if seconds else 0,
+        }
+        telemetry.update(details)
+        progress_callback(telemetry)
+
+    """
+    Youtube(): save_upload_state - writes the resumable session uri and offset of an upload to a json file
+
+    params:
+        state_path: String - path of the state file
+        file_path: String - path of the uploaded file
+        insert_request: Object - created by insert Youtube API call
+
+    returns:
+    """
+    def save_upload_state(self, state_path, file_path, insert_request):
+        stat = os.stat(file_path)
+        temporary_path = state_path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump({
+                "file": os.path.abspath(file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "resumable_uri": insert_request.resumable_uri,
+                "resumable_progress": insert_request.resumable_progress,
+            }, f)
+        os.replace(temporary_path, state_path)
+
+    """
+    Youtube(): load_upload_state - reads the state written by save_upload_state if it belongs to the same, unchanged file
+
+    params:
+        state_path: String - path of the state file
+        file_path: String - path of the file being uploaded
+
+    returns:
+        Dictionary: saved state, or None if there is no usable state
+    """
+    def load_upload_state(self, state_path, file_path):
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        stat = os.stat(file_path)
+        if state.get("file") != os.path.abspath(file_path) or state.get("size") != stat.st_size or state.get("mtime_ns") != stat.st_mtime_ns or not state.get("resumable_uri"):
+            return None
+        return state
 
     """
     Youtube(): initialize_upload - gathers and sets all information needed for file upload
@@ -168,14 +283,16 @@ class Youtube:
                     categoryId = 1,
                     privacyStatus = VALID_PRIVACY_STATUSES[1]
                 )
+        chunk_size: Integer - bytes per upload request. Must be a multiple of 256 KB. -1 sends the whole file in one request
+        state_path: String - json file used to persist the resumable session, so a crashed process resumes mid-file
+        progress_callback: Function - called with progress, throughput and retry telemetry. See resumable_upload
 
     returns:
         String: video id from succesful video upload
     """
-    def initialize_upload(self, options):
+    def initialize_upload(self, options, chunk_size=DEFAULT_CHUNK_SIZE, state_path=None, progress_callback=None):
         keywords = options.get("keywords", "")
-        if keywords:
-            tags = keywords.split(",")
+        tags = keywords.split(",") if keywords else []
         body = dict(
             snippet = dict(
                 title = options.get("title", ""),
@@ -190,6 +307,6 @@ class Youtube:
         insert_request = self.service.videos().insert(
             part=",".join(body.keys()),
             body=body,
-            media_body=MediaFileUpload(options.get("file"), chunksize=-1, resumable=True)
+            media_body=MediaFileUpload(options.get("file"), chunksize=chunk_size, resumable=True)
         ) 
-        return self.resumable_upload(insert_request)
\ No newline at end of file
+        return self.resumable_upload(insert_request, progress_callback=progress_callback, state_path=state_path, file_path=options.get("file"))
\ No newline at end of file